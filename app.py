@@ -2,17 +2,32 @@
 import os
 import re
 import json
+import base64
+import csv
+import io
+import hashlib
+import math
 import random
 import time
 import sqlite3
-from datetime import datetime
-from flask import Flask, render_template, request, jsonify, g, redirect, url_for, flash, session, make_response
+from datetime import datetime, timedelta, timezone
+from flask import Flask, render_template, request, jsonify, g, redirect, url_for, flash, session, make_response, Response
 import struct
 import socket
+import select
+import shlex
 import atexit
 import sys
 import threading
+import asyncio
+import collections
+import itertools
+import contextlib
+import gzip
+import multiprocessing
+import concurrent.futures
 import time
+import click
 from sshtunnel import SSHTunnelForwarder
 import paramiko
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
@@ -39,11 +54,13 @@ def load_user(user_id):
         return User(user_row['id'], user_row['username'])
     return None
 
+MC_FORMAT_RE = re.compile(r'§.')
+
 def clean_mc_string(text):
     if not text: return ""
     # Odstraní § následované libovolným znakem (barvy/formátování)
     # Nahrazujeme mezerou, aby se neslepila slova (např. Reason§rName -> Reason Name)
-    return re.sub(r'§.', ' ', text).strip()
+    return MC_FORMAT_RE.sub(' ', text).strip()
 
 def format_playtime(seconds):
     """Převede vteřiny na lidsky čitelný formát (např. 2h 45m)."""
@@ -68,6 +85,13 @@ RCON_PORT = int(os.environ.get('RCON_PORT', 25575))
 RCON_PASSWORD = os.environ.get('RCON_PASSWORD', 'minecraft')
 MOCK_MODE = os.environ.get('MOCK_MODE', 'False').lower() == 'true'
 BLUEMAP_URL = os.environ.get('BLUEMAP_URL', '')
+# app.run(debug=True) v __main__ pouští reloader: rodičovský proces jen hlídá soubory a aplikaci
+# spouští znovu v potomkovi (WERKZEUG_RUN_MAIN=true). Vlákna na pozadí (tail logu, indexace, sampler)
+# patří jen do procesu, který obsluhuje requesty - jinak by dvě kopie zapisovaly do stejných řádků DB.
+# Procesy poolu backfillu (forkserver i jeho workery, kde je app.py importovaný jako __mp_main__)
+# modul importují také - ty nesmí spouštět nic.
+RUN_BACKGROUND_WORKERS = (multiprocessing.parent_process() is None and __name__ != '__mp_main__'
+                          and not (__name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'))
 
 # Database path - persistent storage
 DATA_DIR = '/app/data'
@@ -81,6 +105,7 @@ SSH_PORT = int(os.environ.get('SSH_PORT', 22))
 SSH_USER = os.environ.get('SSH_USER')
 SSH_PASSWORD = os.environ.get('SSH_PASSWORD')
 SSH_TUNNEL = None
+HW_PROBE_MODE = os.environ.get('HW_PROBE_MODE', 'batch').lower()  # batch | legacy
 
 # Falešná data pro testování
 MOCK_PLAYERS = [
@@ -91,45 +116,317 @@ MOCK_PLAYERS = [
 MOCK_LOGS = []
 
 # --- DATABASE ---
+# WAL: čtenáři (dashboard) neblokují zápisy trackeru a naopak. Spojení se drží
+# jedno na vlákno a znovu používá, místo sqlite3.connect pro každý request.
+DB_BUSY_TIMEOUT = float(os.environ.get('DB_BUSY_TIMEOUT', 5))  # sekundy (jako ostatní timeouty)
+DB_CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', 8192))
+_db_local = threading.local()
+
+def _connect_db(path):
+    db = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT)
+    db.row_factory = sqlite3.Row
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')  # ve WAL bezpečné, fsync jen při checkpointu
+    db.execute(f'PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT * 1000)}')
+    db.execute(f'PRAGMA cache_size=-{DB_CACHE_SIZE_KB}')
+    db.execute('PRAGMA temp_store=MEMORY')
+    return db
+
+def get_thread_db():
+    """Spojení vlastněné aktuálním vláknem (request i vlákna na pozadí)."""
+    db = getattr(_db_local, 'db', None)
+    if db is None or _db_local.path != DB_PATH:
+        if db is not None: db.close()
+        db = _db_local.db = _connect_db(DB_PATH)
+        _db_local.path = DB_PATH
+    return db
+
 def get_db():
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DB_PATH)
-        db.row_factory = sqlite3.Row
+        db = g._database = get_thread_db()
     return db
 
 @app.teardown_appcontext
 def close_connection(exception):
+    # Spojení nezavíráme (patří vláknu), jen nenecháme viset nedokončenou transakci
     db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
+    if db is not None and db.in_transaction:
+        db.rollback()
+
+# --- SCHEMA MIGRATIONS ---
+# Každá migrace se provede právě jednou (verze se zapisuje do schema_version) a celá
+# v jedné transakci. Kroky jsou idempotentní, aby prošly i nad DB ze starších verzí,
+# které schéma zakládaly přes CREATE TABLE IF NOT EXISTS.
+def _has_column(cursor, table, column):
+    return any(row[1] == column for row in cursor.execute(f"PRAGMA table_info({table})"))
+
+def _add_column(cursor, table, column, decl):
+    if not _has_column(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+def _migration_base_schema(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS players (
+            name TEXT PRIMARY KEY,
+            first_seen TEXT,
+            last_seen TEXT,
+            group_name TEXT DEFAULT 'Nezařazeno',
+            is_online BOOLEAN DEFAULT 0,
+            total_playtime INTEGER DEFAULT 0
+        )
+    ''')
+    # Starší DB nemusí mít total_playtime
+    _add_column(cursor, 'players', 'total_playtime', 'INTEGER DEFAULT 0')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS modules (
+            id TEXT PRIMARY KEY,
+            enabled INTEGER DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS favorite_commands (
+            command_id TEXT PRIMARY KEY
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            player_name TEXT,
+            login_time TEXT,
+            logout_time TEXT,
+            duration INTEGER DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS system_config (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metric_rollups (
+            metric TEXT NOT NULL,
+            step INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            sum REAL NOT NULL,
+            min REAL,
+            max REAL,
+            PRIMARY KEY (metric, step, bucket)
+        ) WITHOUT ROWID
+    ''')
+
+def _migration_indexes(cursor):
+    # Historie hráče, otevřené session (partial index), uzavírání session a seznam online hráčů
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_player ON attendance(player_name, login_time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_open ON attendance(player_name, login_time) WHERE logout_time IS NULL')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_logout ON attendance(logout_time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_players_online ON players(is_online, last_seen)')
+
+def _migration_epoch_timestamps(cursor):
+    # Časy jako unix epoch (INTEGER), aby rozsahy a délky session šly počítat přímo v SQL.
+    # Textové sloupce zůstávají kvůli zobrazení; staré hodnoty jsou v lokálním čase.
+    _add_column(cursor, 'attendance', 'login_ts', 'INTEGER')
+    _add_column(cursor, 'attendance', 'logout_ts', 'INTEGER')
+    _add_column(cursor, 'players', 'first_seen_ts', 'INTEGER')
+    _add_column(cursor, 'players', 'last_seen_ts', 'INTEGER')
+    cursor.execute('''
+        UPDATE attendance SET
+            login_ts = CAST(strftime('%s', login_time, 'utc') AS INTEGER),
+            logout_ts = CAST(strftime('%s', logout_time, 'utc') AS INTEGER)
+        WHERE login_ts IS NULL
+    ''')
+    cursor.execute('''
+        UPDATE players SET
+            first_seen_ts = CAST(strftime('%s', first_seen, 'utc') AS INTEGER),
+            last_seen_ts = CAST(strftime('%s', last_seen, 'utc') AS INTEGER)
+        WHERE last_seen_ts IS NULL
+    ''')
+    # Indexy přesouváme na epoch sloupce, které teď používají dotazy
+    for name in ('idx_attendance_player', 'idx_attendance_open', 'idx_attendance_logout', 'idx_players_online'):
+        cursor.execute(f'DROP INDEX IF EXISTS {name}')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_player_ts ON attendance(player_name, login_ts)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_open_ts ON attendance(player_name, login_ts) WHERE logout_ts IS NULL')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_logout_ts ON attendance(logout_ts)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_players_online_ts ON players(is_online, last_seen_ts)')
+
+def _migration_player_paging(cursor):
+    # Keyset stránkování potřebuje neprázdné klíče a index pro každé povolené řazení
+    cursor.execute('UPDATE players SET last_seen_ts = COALESCE(first_seen_ts, 0) WHERE last_seen_ts IS NULL')
+    cursor.execute('UPDATE players SET first_seen_ts = last_seen_ts WHERE first_seen_ts IS NULL')
+    cursor.execute('DROP INDEX IF EXISTS idx_players_online_ts')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_players_page_last_seen ON players(is_online, last_seen_ts, name)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_players_page_first_seen ON players(is_online, first_seen_ts, name)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_players_page_name ON players(is_online DESC, name)')
+    # Seznam skupin pro filtr (DISTINCT) se čte přímo z indexu
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_players_group ON players(group_name, last_seen_ts)')
+
+def _migration_log_cursor(cursor):
+    # Kam až byl log zpracován (inode + bajtový offset), aby sledování po restartu navázalo
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS log_cursor (
+            name TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            inode TEXT NOT NULL,
+            offset INTEGER NOT NULL,
+            last_ts INTEGER,
+            updated_at INTEGER
+        )
+    ''')
+
+def _migration_attendance_rollups(cursor):
+    # Předpočítané agregace docházky: odehraný čas hráče po dnech a souběh hráčů po hodinách
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_daily (
+            player_name TEXT NOT NULL,
+            day TEXT NOT NULL,
+            seconds INTEGER NOT NULL DEFAULT 0,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (player_name, day)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_daily_day ON attendance_daily(day, player_name, seconds)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_hourly (
+            hour_ts INTEGER PRIMARY KEY,
+            player_seconds INTEGER NOT NULL DEFAULT 0,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            carried INTEGER NOT NULL DEFAULT 0,
+            peak INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    rebuild_attendance_rollups(cursor.connection)
+
+def _migration_attendance_login_index(cursor):
+    # Filtrování/stránkování docházky podle času bez ohledu na hráče (rowid id je v indexu implicitně)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_login ON attendance(login_ts)')
+
+def _migration_content_versions(cursor):
+    # Čítač změn pro ETag/Last-Modified pollovaných endpointů
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS content_versions (
+            resource TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL
+        )
+    ''')
+
+def _migration_log_search(cursor):
+    # Zaindexované řádky logu (latest.log živě, archivy *.log.gz na pozadí) + FTS5 nad zprávou.
+    # (ts, line_hash) je unikátní: řádky z latest.log se po rotaci objeví znovu v archivu.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS log_lines (
+            id INTEGER PRIMARY KEY,
+            ts INTEGER NOT NULL,
+            level TEXT,
+            thread TEXT,
+            player TEXT,
+            source TEXT NOT NULL,
+            message TEXT NOT NULL,
+            line_hash INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_log_lines_ts ON log_lines(ts, line_hash)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_log_lines_player ON log_lines(player, ts) WHERE player IS NOT NULL')
+    cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS log_fts USING fts5(message, content='log_lines', content_rowid='id')")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS log_lines_ai AFTER INSERT ON log_lines BEGIN
+            INSERT INTO log_fts(rowid, message) VALUES (new.id, new.message);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS log_lines_ad AFTER DELETE ON log_lines BEGIN
+            INSERT INTO log_fts(log_fts, rowid, message) VALUES ('delete', old.id, old.message);
+        END
+    ''')
+    # Postup indexace archivů: offset = už zpracované dekomprimované bajty
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS log_files (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            offset INTEGER NOT NULL DEFAULT 0,
+            last_ts INTEGER,
+            lines INTEGER NOT NULL DEFAULT 0,
+            done INTEGER NOT NULL DEFAULT 0,
+            updated_at INTEGER
+        )
+    ''')
+
+def _migration_attendance_backfill(cursor):
+    # Doplnění docházky z archivů: hotové soubory + session otevřené na konci souboru (carry, JSON),
+    # aby přerušený backfill pokračoval dalším archivem
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_backfill (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            last_ts INTEGER,
+            carry TEXT NOT NULL DEFAULT '{}',
+            updated_at INTEGER
+        )
+    ''')
+
+def _migration_log_line_occurrence(cursor):
+    # Stejný řádek se ve stejné sekundě legitimně opakuje (chat, varování, řádky stack trace se
+    # zděděným časem) -> klíč (ts, line_hash) doplněný o pořadí výskytu
+    _add_column(cursor, 'log_lines', 'occurrence', 'INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('DROP INDEX IF EXISTS idx_log_lines_ts')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_log_lines_key ON log_lines(ts, line_hash, occurrence)')
+
+MIGRATIONS = [
+    (1, 'base schema', _migration_base_schema),
+    (2, 'attendance and players indexes', _migration_indexes),
+    (3, 'integer epoch timestamps', _migration_epoch_timestamps),
+    (4, 'player paging indexes', _migration_player_paging),
+    (5, 'content versions', _migration_content_versions),
+    (6, 'log cursor', _migration_log_cursor),
+    (7, 'attendance rollups', _migration_attendance_rollups),
+    (8, 'attendance login index', _migration_attendance_login_index),
+    (9, 'log search index', _migration_log_search),
+    (10, 'attendance backfill', _migration_attendance_backfill),
+    (11, 'log line occurrence', _migration_log_line_occurrence),
+]
+
+def migrate_db(db):
+    """Aplikuje chybějící migrace v pořadí. Vrací seznam nově aplikovaných verzí."""
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TEXT
+        )
+    ''')
+    db.commit()
+    current = db.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if version <= current: continue
+        try:
+            db.execute('BEGIN')
+            step(db.cursor())
+            db.execute('INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)',
+                       (version, name, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        print(f"DB migration {version} ({name}) applied.")
+        applied.append(version)
+    return applied
 
 def init_db():
     with app.app_context():
         db = get_db()
+        migrate_db(db)
         cursor = db.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS players (
-                name TEXT PRIMARY KEY,
-                first_seen TEXT,
-                last_seen TEXT,
-                group_name TEXT DEFAULT 'Nezařazeno',
-                is_online BOOLEAN DEFAULT 0,
-                total_playtime INTEGER DEFAULT 0
-            )
-        ''')
-        
-        # Migrace: Přidat total_playtime pokud chybí
-        try:
-            cursor.execute("ALTER TABLE players ADD COLUMN total_playtime INTEGER DEFAULT 0")
-        except:
-            pass # Sloupec už pravděpodobně existuje
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS modules (
-                id TEXT PRIMARY KEY,
-                enabled INTEGER DEFAULT 0
-            )
-        ''')
         
         # Initialize default modules if table is empty
         module_count = cursor.execute('SELECT COUNT(*) FROM modules').fetchone()[0]
@@ -141,35 +438,7 @@ def init_db():
                 ('authme', 1)
             ]
             cursor.executemany('INSERT INTO modules (id, enabled) VALUES (?, ?)', default_modules)
-        
-        # Zajištění správných modulů (smazat staré, nahrát nové)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS favorite_commands (
-                command_id TEXT PRIMARY KEY
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS attendance (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                player_name TEXT,
-                login_time TEXT,
-                logout_time TEXT,
-                duration INTEGER DEFAULT 0
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS system_config (
-                key TEXT PRIMARY KEY,
-                value TEXT
-            )
-        ''')
+
 
         # Check for system config
         if cursor.execute("SELECT COUNT(*) FROM system_config").fetchone()[0] == 0:
@@ -193,6 +462,79 @@ def init_db():
         
         db.commit()
 
+# --- CONDITIONAL GET (ETag / Last-Modified) ---
+# Pollované fragmenty a JSON nesou levný token verze (čítač změn v DB, mtime souboru, offset logu).
+# Má-li klient aktuální verzi, vrátíme 304 dřív, než se začne dotazovat DB nebo renderovat šablona.
+CONTENT_EPOCH = format(int(time.time()), 'x')  # po restartu (nové šablony) neplatí staré ETagy
+
+def bump_content_version(db, *resources):
+    """Zvýší čítač verze zdrojů. Volat ve stejné transakci jako samotnou změnu dat."""
+    now_ts = int(time.time())
+    db.executemany('''
+        INSERT INTO content_versions (resource, version, updated_at) VALUES (?, 1, ?)
+        ON CONFLICT(resource) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+    ''', [(resource, now_ts) for resource in resources])
+
+def content_version(db, *resources):
+    """Vrátí (token, last_modified) pro kombinaci zdrojů - jeden dotaz přes primární klíč."""
+    placeholders = ','.join('?' * len(resources))
+    rows = {row['resource']: row for row in db.execute(
+        f"SELECT resource, version, updated_at FROM content_versions WHERE resource IN ({placeholders})",
+        resources).fetchall()}
+    last_modified = max((row['updated_at'] for row in rows.values()), default=0)
+    token = '.'.join(str(rows[r]['version']) if r in rows else '0' for r in resources)
+    return f"{token}-{last_modified}", last_modified or None
+
+def make_etag(token):
+    return f"{CONTENT_EPOCH}:{token}"
+
+def client_etag_tokens():
+    """Tokeny z If-None-Match, které vydala tato instance (bez prefixu CONTENT_EPOCH)."""
+    prefix = f"{CONTENT_EPOCH}:"
+    return [tag[len(prefix):] for tag in request.if_none_match.as_set(include_weak=True) if tag.startswith(prefix)]
+
+def client_has_version(token, last_modified=None):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(make_etag(token))
+    if last_modified and request.if_modified_since:
+        return request.if_modified_since.timestamp() >= int(last_modified)
+    return False
+
+def with_validators(resp, token, last_modified=None):
+    """Přidá ETag/Last-Modified; no-cache = prohlížeč si odpověď drží, ale vždy ji revaliduje."""
+    resp.set_etag(make_etag(token))
+    if last_modified:
+        resp.last_modified = datetime.fromtimestamp(int(last_modified), timezone.utc)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+def not_modified(token, last_modified=None):
+    """304 odpověď, pokud má klient aktuální verzi, jinak None (endpoint pokračuje)."""
+    if not client_has_version(token, last_modified):
+        return None
+    return with_validators(make_response('', 304), token, last_modified)
+
+def read_remote_if_changed(client, path, read_cmd, known=()):
+    """Jedním SSH voláním zjistí verzi souboru (inode-velikost-mtime) a obsah přečte jen tehdy,
+    když verze není mezi `known`. Vrací (token, stdout nebo None při shodě, stderr)."""
+    known = [t for t in known if t][:4]
+    known_args = ' '.join(shlex.quote(t) for t in known)
+    cmd = (f"v=$(stat -c %i-%s-%Y {shlex.quote(path)} 2>/dev/null); echo \"v=$v\"; "
+           f"for k in {known_args}; do [ -n \"$v\" ] && [ \"$k\" = \"$v\" ] && exit 0; done; {read_cmd}")
+    stdin, stdout, stderr = client.exec_command(cmd)
+    out = stdout.read().decode('utf8', errors='ignore')
+    err = stderr.read().decode('utf8', errors='ignore')
+    first, _, body = out.partition('\n')
+    token = first[2:] if first.startswith('v=') else ''
+    if token and not body and token in known:
+        return token, None, err
+    return token or None, body, err
+
+def remote_file_mtime(token):
+    """mtime z tokenu vzdáleného souboru (inode-velikost-mtime), jinak None."""
+    parts = (token or '').split('-')
+    return int(parts[-1]) if len(parts) == 3 and parts[-1].isdigit() else None
+
 # --- SSH & SYSTEM STATS ---
 def get_connection_config():
     """Načte konfiguraci z DB."""
@@ -203,31 +545,237 @@ def get_connection_config():
     except:
         return {}
 
-def get_ssh_client():
-    conf = get_connection_config()
-    host = conf.get('ssh_host') or os.environ.get('SSH_HOST')
-    user = conf.get('ssh_user') or os.environ.get('SSH_USER')
-    password = conf.get('ssh_password') or os.environ.get('SSH_PASSWORD')
-    port = int(conf.get('ssh_port') or os.environ.get('SSH_PORT', 22))
+# --- SSH CONNECTION POOL ---
+# Jedno autentizované SSH spojení unese více kanálů (exec_command, sftp) najednou,
+# takže místo handshaku pro každý request si kanály půjčujeme ze sdílených spojení.
+SSH_POOL_MAX_CONNECTIONS = int(os.environ.get('SSH_POOL_MAX_CONNECTIONS', 2))
+SSH_POOL_MAX_CHANNELS = int(os.environ.get('SSH_POOL_MAX_CHANNELS', 8))  # sshd MaxSessions je výchozí 10
+SSH_POOL_IDLE_TIMEOUT = int(os.environ.get('SSH_POOL_IDLE_TIMEOUT', 300))
+SSH_POOL_WAIT_TIMEOUT = float(os.environ.get('SSH_POOL_WAIT_TIMEOUT', 10))  # čekání na volný kanál
+SSH_CHANNEL_RETRIES = 5
+SSH_KEEPALIVE = 30
 
-    if not host or not user: return None
-    try:
+class _SSHConnection:
+    def __init__(self, client):
+        self.client = client
+        self.leases = 0
+        self.created = time.time()
+        self.last_used = time.time()
+
+    def is_alive(self):
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+class PooledSSHClient:
+    """Zapůjčené spojení z SSH poolu. close() spojení nezavírá, jen ho vrací do poolu."""
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def _with_channel(self, fn):
+        for attempt in range(SSH_CHANNEL_RETRIES):
+            try:
+                return fn(self._conn.client)
+            except (paramiko.SSHException, EOFError, OSError) as e:
+                if attempt == SSH_CHANNEL_RETRIES - 1: raise
+                if self._conn.is_alive():
+                    # Transport žije, jen sshd odmítl další kanál (MaxSessions). Zahodit ho nesmíme -
+                    # běží na něm kanály ostatních vláken (tail logu) -> počkat, až se kanál uvolní.
+                    time.sleep(0.1 * 2 ** attempt)
+                    continue
+                # Transport umřel mezi health checkem a otevřením kanálu -> nové spojení
+                print(f"SSH Pool: transport lost ({e}), reconnecting...")
+                self._pool._discard(self._conn)
+                self._conn = self._pool._acquire_connection()
+                if self._conn is None: raise
+
+    def exec_command(self, command, timeout=None):
+        return self._with_channel(lambda c: c.exec_command(command, timeout=timeout))
+
+    def open_sftp(self):
+        return self._with_channel(lambda c: c.open_sftp())
+
+    def get_transport(self):
+        return self._conn.client.get_transport() if self._conn else None
+
+    def close(self):
+        if self._conn is not None:
+            self._pool._release(self._conn)
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+class SSHPool:
+    """Thread-safe pool dlouho žijících SSH spojení se sdílením kanálů."""
+    def __init__(self, max_connections=2, max_channels=8, idle_timeout=300):
+        self.max_connections = max_connections
+        self.max_channels = max_channels
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)  # uvolněný kanál / zahozené spojení
+        self._connections = []
+        self._params = None
+        self._stats = {'connects': 0, 'reuses': 0, 'failures': 0, 'evictions': 0, 'config_reloads': 0,
+                       'waits': 0, 'wait_timeouts': 0}
+
+    def _resolve_params(self):
+        conf = get_connection_config()
+        host = conf.get('ssh_host') or os.environ.get('SSH_HOST')
+        user = conf.get('ssh_user') or os.environ.get('SSH_USER')
+        password = conf.get('ssh_password') or os.environ.get('SSH_PASSWORD')
+        port = int(conf.get('ssh_port') or os.environ.get('SSH_PORT', 22))
+        return (host, port, user, password, os.environ.get('SSH_KEY_PATH'))
+
+    def _connect(self, params):
+        host, port, user, password, key_filename = params
         client = paramiko.SSHClient()
         client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        client.connect(host, port=port, username=user, password=password, timeout=5)
-        return client
-    except Exception as e:
-        print(f"SSH Connection Error: {e}")
-        return None
+        client.connect(host, port=port, username=user, password=password,
+                       key_filename=key_filename, timeout=5)
+        client.get_transport().set_keepalive(SSH_KEEPALIVE)
+        return _SSHConnection(client)
+
+    def _close_locked(self, conn):
+        if conn in self._connections:
+            self._connections.remove(conn)
+        try: conn.client.close()
+        except: pass
+
+    def _evict_locked(self):
+        now = time.time()
+        for conn in list(self._connections):
+            idle = conn.leases == 0 and now - conn.last_used > self.idle_timeout
+            if idle or not conn.is_alive():
+                self._stats['evictions'] += 1
+                self._close_locked(conn)
+
+    def _acquire_connection(self, params=None):
+        with self._lock:
+            if params is not None and params != self._params:
+                # Změna v system_config -> stará spojení zahodíme
+                if self._params is not None:
+                    self._stats['config_reloads'] += 1
+                for conn in list(self._connections):
+                    self._close_locked(conn)
+                self._params = params
+            deadline = time.time() + SSH_POOL_WAIT_TIMEOUT
+            waited = False
+            while True:
+                if self._params is None:
+                    return None
+                self._evict_locked()
+                free = [c for c in self._connections if c.leases < self.max_channels]
+                if free and (min(c.leases for c in free) == 0 or len(self._connections) >= self.max_connections):
+                    conn = min(free, key=lambda c: c.leases)
+                    self._stats['reuses'] += 1
+                    break
+                if len(self._connections) < self.max_connections:
+                    try:
+                        conn = self._connect(self._params)
+                    except Exception as e:
+                        self._stats['failures'] += 1
+                        print(f"SSH Connection Error: {e}")
+                        return None
+                    self._connections.append(conn)
+                    self._stats['connects'] += 1
+                    break
+                # Vše plně vytížené: nepřetěžovat (sshd by kanál odmítl), počkat na uvolnění
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._stats['wait_timeouts'] += 1
+                    print("SSH Pool: no free channel, giving up")
+                    return None
+                if not waited:
+                    self._stats['waits'] += 1
+                    waited = True
+                self._available.wait(remaining)
+            conn.leases += 1
+            conn.last_used = time.time()
+            return conn
+
+    def _release(self, conn):
+        with self._lock:
+            conn.leases = max(0, conn.leases - 1)
+            conn.last_used = time.time()
+            self._available.notify()
+
+    def _discard(self, conn):
+        with self._lock:
+            self._stats['evictions'] += 1
+            self._close_locked(conn)
+            self._available.notify_all()
+
+    def acquire(self):
+        params = self._resolve_params()
+        if not params[0] or not params[2]: return None
+        conn = self._acquire_connection(params)
+        return PooledSSHClient(self, conn) if conn else None
+
+    def reset(self):
+        with self._lock:
+            for conn in list(self._connections):
+                self._close_locked(conn)
+            self._params = None
+            self._available.notify_all()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats,
+                        connections=len(self._connections),
+                        active_channels=sum(c.leases for c in self._connections),
+                        max_connections=self.max_connections,
+                        max_channels=self.max_channels)
+
+SSH_POOL = SSHPool(SSH_POOL_MAX_CONNECTIONS, SSH_POOL_MAX_CHANNELS, SSH_POOL_IDLE_TIMEOUT)
+atexit.register(SSH_POOL.reset)
+
+def get_ssh_client():
+    """Jediný vstupní bod pro SSH. Vrací zapůjčené spojení z poolu (nebo None)."""
+    return SSH_POOL.acquire()
 
 # --- THREAD-SAFE SIMPLE RCON ---
+# Pipelined režim: každý příkaz má vlastní ID a hned za ním posíláme "sentinel" paket
+# neplatného typu s dalším ID. Server zpracovává pakety po pořadí, takže odpověď na
+# sentinel (u Minecraftu "Unknown request 0") znamená, že všechny fragmenty odpovědi
+# na příkaz (server je dělí po 4096 B) už dorazily.
+RCON_PROTOCOL = os.environ.get('RCON_PROTOCOL', 'pipelined').lower()  # pipelined | simple
+RCON_SENTINEL_TYPE = 0  # SERVERDATA_RESPONSE_VALUE - server ho neumí, odpoví prázdnou/chybovou odpovědí
+
+def rcon_packet(request_id, out_type, out_data):
+    # Packet: Size(4), ID(4), Type(4), Body(str+null), Null(1)
+    # Type: 3=Login, 2=Command
+    out_payload = struct.pack('<ii', request_id, out_type) + out_data.encode('utf8') + b'\x00\x00'
+    return struct.pack('<i', len(out_payload)) + out_payload
+
+class _RCONReply:
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+
+    def text(self):
+        # Fragmenty spojujeme jako bajty - UTF-8 znak může být rozdělen mezi pakety
+        return b''.join(self.chunks).decode('utf8', errors='ignore')
+
 class SimpleRCON:
-    def __init__(self, host, password, port=25575):
+    def __init__(self, host, password, port=25575, pipelined=None):
         self.host = host
         self.port = port
         self.password = password
         self.socket = None
-        self.request_id = random.randint(0, 2147483647)
+        self.pipelined = RCON_PROTOCOL == 'pipelined' if pipelined is None else pipelined
+        self.request_id = random.randint(1, 1 << 30)
+        self.params = None
+        self.last_used = time.time()
+        self._id_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._pending = {}    # request_id -> _RCONReply
+        self._sentinels = {}  # sentinel_id -> request_id příkazu
 
     def __enter__(self):
         self.connect()
@@ -247,72 +795,146 @@ class SimpleRCON:
             self.socket.close()
             self.socket = None
 
-    def _send(self, out_type, out_data):
-        if self.socket is None: raise Exception("Not connected")
-        
-        # Packet: Size(4), ID(4), Type(4), Body(str+null), Null(1)
-        # Type: 3=Login, 2=Command
-        out_payload = struct.pack('<ii', self.request_id, out_type) + out_data.encode('utf8') + b'\x00\x00'
-        out_length = struct.pack('<i', len(out_payload))
-        self.socket.send(out_length + out_payload)
-
-    def _read(self, expected_type):
-        # Read length
-        in_len_data = b''
-        while len(in_len_data) < 4:
-            chunk = self.socket.recv(4 - len(in_len_data))
-            if not chunk: raise Exception("Connection closed")
-            in_len_data += chunk
-            
-        in_len = struct.unpack('<i', in_len_data)[0]
-        
-        # Read payload
-        in_payload = b''
-        while len(in_payload) < in_len:
-            chunk = self.socket.recv(in_len - len(in_payload))
+    def is_alive(self):
+        """Levný health check bez round tripu: čitelný socket s 0 bajty = server spojení zavřel."""
+        if self.socket is None:
+            return True  # připojí se líně při prvním příkazu
+        try:
+            readable, _, _ = select.select([self.socket], [], [], 0)
+            if readable and not self.socket.recv(1, socket.MSG_PEEK):
+                return False
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def _new_id(self):
+        with self._id_lock:
+            self.request_id = self.request_id % 2147483646 + 1
+            return self.request_id
+
+    def _recv_exact(self, n):
+        data = b''
+        while len(data) < n:
+            chunk = self.socket.recv(n - len(data))
             if not chunk: raise Exception("Connection closed")
-            in_payload += chunk
-            
-        # Parse: ID(4), Type(4), Body...
-        in_id = struct.unpack('<i', in_payload[0:4])[0]
-        in_type = struct.unpack('<i', in_payload[4:8])[0] # Notchecking type strictly
+            data += chunk
+        return data
+
+    def _read_packet(self):
+        if self.socket is None: raise Exception("Not connected")
+        in_len = struct.unpack('<i', self._recv_exact(4))[0]
+        in_payload = self._recv_exact(in_len)
         
-        # Body is rest excluding last 2 null bytes
-        if len(in_payload) > 10:
-            body = in_payload[8:-2]
-            return body.decode('utf8', errors='ignore')
-        return ""
+        # Parse: ID(4), Type(4), Body..., Null(2)
+        in_id, in_type = struct.unpack('<ii', in_payload[0:8])
+        return in_id, in_type, in_payload[8:-2]
 
     def authenticate(self):
-        self._send(3, self.password)
-        resp = self._read(2) 
+        auth_id = self._new_id()
+        self.socket.sendall(rcon_packet(auth_id, 3, self.password))
+        in_id, in_type, _ = self._read_packet()
+        # Source servery posílají před AUTH_RESPONSE ještě prázdný RESPONSE_VALUE
+        if in_type == 0:
+            in_id, in_type, _ = self._read_packet()
+        if in_id == -1:
+            raise Exception("RCON authentication failed")
+
+    def _submit(self, cmds):
+        """Odešle příkazy (a jejich sentinely) jedním sendall a vrátí čekající odpovědi."""
+        replies = []
+        with self._send_lock:
+            if not self.socket:
+                self.connect()
+                self.authenticate()
+            out = b''
+            for cmd in cmds:
+                reply = _RCONReply()
+                cmd_id = self._new_id()
+                self._pending[cmd_id] = reply
+                out += rcon_packet(cmd_id, 2, cmd)
+                if self.pipelined:
+                    sentinel_id = self._new_id()
+                    self._sentinels[sentinel_id] = cmd_id
+                    out += rcon_packet(sentinel_id, RCON_SENTINEL_TYPE, '')
+                replies.append(reply)
+            self.socket.sendall(out)
+        return replies
+
+    def _dispatch(self, in_id, body):
+        if in_id in self._sentinels:
+            reply = self._pending.pop(self._sentinels.pop(in_id), None)
+            if reply: reply.done = True
+        elif in_id in self._pending:
+            reply = self._pending[in_id]
+            reply.chunks.append(body)
+            if not self.pipelined:
+                # Bez sentinelu předpokládáme jednopaketovou odpověď
+                del self._pending[in_id]
+                reply.done = True
+        # Jinak opožděná odpověď na zrušený požadavek -> zahodit
+
+    def _fail_all(self, error):
+        for reply in list(self._pending.values()):
+            reply.error = error
+            reply.done = True
+        self._pending.clear()
+        self._sentinels.clear()
+        self.disconnect()
+
+    def _wait(self, reply):
+        # Kdo drží _read_lock, čte ze socketu a rozděluje pakety podle ID i ostatním čekajícím
+        while not reply.done:
+            with self._read_lock:
+                if reply.done: break
+                try:
+                    in_id, in_type, body = self._read_packet()
+                except Exception as e:
+                    self._fail_all(e)
+                    break
+                self._dispatch(in_id, body)
+        if reply.error: raise reply.error
+        return reply.text()
+
+    def command_batch(self, cmds):
+        """Pošle více příkazů najednou po jednom socketu a vrátí odpovědi ve stejném pořadí."""
+        replies = self._submit(cmds)
+        return [self._wait(reply) for reply in replies]
 
     def command(self, cmd):
-        if not self.socket:
-            self.connect()
-            self.authenticate()
         try:
-            self._send(2, cmd)
-            return self._read(0)
+            return self.command_batch([cmd])[0]
         except Exception as e:
             # Reconnect on failure (broken pipe, timeout)
             print(f"RCON Connection lost ({e}), reconnecting...")
             self.disconnect()
-            self.connect()
-            self.authenticate()
-            self._send(2, cmd)
-            return self._read(0)
+            return self.command_batch([cmd])[0]
 
-# Globální RCON klient (aby se nepřipojoval pořád dokola -> log spam)
-GLOBAL_RCON = None
-RCON_LOCK = threading.Lock()
+# --- RCON CONNECTION POOL ---
+# Místo jednoho GLOBAL_RCON za globálním zámkem držíme několik autentizovaných spojení.
+# Každé spojení má v jednu chvíli jen jednoho vlastníka (checkout), takže pomalá
+# odpověď blokuje jen svého volajícího, ne tracker, statistiky a konzoli najednou.
+RCON_POOL_SIZE = int(os.environ.get('RCON_POOL_SIZE', 4))
+RCON_POOL_TIMEOUT = float(os.environ.get('RCON_POOL_TIMEOUT', 10))
+RCON_POOL_IDLE_TIMEOUT = int(os.environ.get('RCON_POOL_IDLE_TIMEOUT', 120))
 
-def get_global_rcon():
-    global GLOBAL_RCON
-    conf = get_connection_config()
-    
-    # Pokud nemame instanci, vytvorime ji
-    if GLOBAL_RCON is None:
+class RCONPoolExhausted(Exception):
+    """Všechna spojení poolu jsou půjčená - přetížení panelu, ne výpadek serveru (breaker ji nepočítá)."""
+
+class RCONPool:
+    """Omezený pool SimpleRCON spojení s líným růstem, health checkem a vyřazováním nečinných."""
+    def __init__(self, max_size=4, checkout_timeout=10, idle_timeout=120):
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+        self._cond = threading.Condition()
+        self._idle = []   # LIFO - nejčerstvější spojení se použije první
+        self._size = 0    # idle + zapůjčená
+        self._params = None
+        self._stats = {'checkouts': 0, 'created': 0, 'evicted': 0, 'errors': 0,
+                       'timeouts': 0, 'wait_total_ms': 0.0, 'wait_max_ms': 0.0}
+
+    def _resolve_params(self):
+        conf = get_connection_config()
         port = int(conf.get('rcon_port') or RCON_PORT)
         host = conf.get('rcon_host') or RCON_HOST
         password = conf.get('rcon_password') or RCON_PASSWORD
@@ -321,10 +943,106 @@ def get_global_rcon():
         if SSH_TUNNEL and SSH_TUNNEL.is_active:
              host = '127.0.0.1'
              port = SSH_TUNNEL.local_bind_port
-        
-        GLOBAL_RCON = SimpleRCON(host, password, port=port)
-    
-    return GLOBAL_RCON
+        return (host, port, password)
+
+    def _close(self, conn):
+        try: conn.disconnect()
+        except: pass
+
+    def _evict_idle_locked(self):
+        now = time.time()
+        for conn in list(self._idle):
+            if now - conn.last_used > self.idle_timeout:
+                self._idle.remove(conn)
+                self._size -= 1
+                self._stats['evicted'] += 1
+                self._close(conn)
+
+    def checkout(self):
+        params = self._resolve_params()
+        start = time.time()
+        deadline = start + self.checkout_timeout
+        with self._cond:
+            if params != self._params:
+                # Změna konfigurace (nebo portu tunelu) -> idle spojení zahodit
+                for conn in self._idle: self._close(conn)
+                self._size -= len(self._idle)
+                self._idle = []
+                self._params = params
+            self._evict_idle_locked()
+
+            conn = None
+            while conn is None:
+                if self._idle:
+                    conn = self._idle.pop()
+                    if conn.params != params or not conn.is_alive():
+                        self._size -= 1
+                        self._stats['evicted'] += 1
+                        self._close(conn)
+                        conn = None
+                elif self._size < self.max_size:
+                    host, port, password = params
+                    conn = SimpleRCON(host, password, port=port)
+                    conn.params = params
+                    self._size += 1
+                    self._stats['created'] += 1
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise RCONPoolExhausted("RCON pool exhausted")
+                    self._cond.wait(remaining)
+
+            waited_ms = (time.time() - start) * 1000
+            self._stats['checkouts'] += 1
+            self._stats['wait_total_ms'] += waited_ms
+            self._stats['wait_max_ms'] = max(self._stats['wait_max_ms'], waited_ms)
+        return conn
+
+    def checkin(self, conn, broken=False):
+        with self._cond:
+            if broken or conn.params != self._params:
+                if broken: self._stats['errors'] += 1
+                self._size -= 1
+                self._close(conn)
+            else:
+                conn.last_used = time.time()
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def connection(self):
+        conn = self.checkout()
+        try:
+            yield conn
+        except Exception:
+            self.checkin(conn, broken=True)
+            raise
+        else:
+            self.checkin(conn)
+
+    def reset(self):
+        with self._cond:
+            for conn in self._idle: self._close(conn)
+            self._size -= len(self._idle)
+            self._idle = []
+            self._params = None  # zapůjčená spojení se zavřou při vrácení
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            checkouts = self._stats['checkouts']
+            return dict(self._stats,
+                        wait_total_ms=round(self._stats['wait_total_ms'], 2),
+                        wait_max_ms=round(self._stats['wait_max_ms'], 2),
+                        size=self._size,
+                        idle=len(self._idle),
+                        in_use=self._size - len(self._idle),
+                        max_size=self.max_size,
+                        wait_avg_ms=round(self._stats['wait_total_ms'] / checkouts, 2) if checkouts else 0)
+
+RCON_POOL = RCONPool(RCON_POOL_SIZE, RCON_POOL_TIMEOUT, RCON_POOL_IDLE_TIMEOUT)
+atexit.register(RCON_POOL.reset)
 
 def start_ssh_tunnel():
     global SSH_TUNNEL
@@ -365,6 +1083,162 @@ def stop_ssh_tunnel():
 
 atexit.register(stop_ssh_tunnel)
 
+# --- HW PROBE ---
+# Všechny metriky hostitele jedním exec_command (jeden round trip). CPU se počítá
+# z rozdílu dvou vzorků /proc/stat mezi voláními, takže nečekáme vteřinu na mpstat.
+HW_PROBE_SCRIPT = r'''
+read -r _ cu cn cs ci cw cq csq cst _ < /proc/stat
+mem=$(free -m | awk 'NR==2{print $3","$2}')
+disk=$(df -h / | tail -1 | awk '{printf "\"%s\",\"%s\"", $5, $4}')
+up=$(uptime -p 2>/dev/null | sed 's/^up //')
+host=$(hostname)
+ip=$(hostname -I 2>/dev/null | awk '{print $1}')
+started=$(docker inspect -f '{{.State.StartedAt}}' "$CONTAINER" 2>/dev/null)
+etime=$(ps -eo etime,comm | grep -i java | head -1 | awk '{print $1}')
+cores=$(nproc 2>/dev/null)
+printf '{"cpu":[%s,%s,%s,%s,%s,%s,%s,%s],"mem":[%s],"disk":[%s],"uptime":"%s","hostname":"%s","ip":"%s","docker_start":"%s","java_etime":"%s","cores":%s}\n' \
+  "${cu:-0}" "${cn:-0}" "${cs:-0}" "${ci:-0}" "${cw:-0}" "${cq:-0}" "${csq:-0}" "${cst:-0}" \
+  "$mem" "$disk" "$up" "$host" "$ip" "$started" "$etime" "${cores:-0}"
+'''
+
+_CPU_SAMPLE = None  # (total, idle) z předchozího probe
+
+def _cpu_pct_from_sample(fields):
+    """CPU využití z delty proti minulému vzorku /proc/stat (první volání = průměr od bootu)."""
+    global _CPU_SAMPLE
+    total = sum(fields)
+    idle = fields[3] + fields[4]  # idle + iowait
+    prev = _CPU_SAMPLE
+    _CPU_SAMPLE = (total, idle)
+    if prev and total > prev[0]:
+        d_total, d_idle = total - prev[0], idle - prev[1]
+    else:
+        d_total, d_idle = total, idle
+    if d_total <= 0: return 0
+    return round(100.0 * (d_total - d_idle) / d_total, 1)
+
+def _format_docker_uptime(docker_start):
+    # Docker vrací ISO formát: 2024-01-29T10:00:00.123456789Z
+    # Ořízneme nanosekundy pro jednodušší parsování
+    clean_start = docker_start.split('.')[0].rstrip('Z')
+    start_dt = datetime.strptime(clean_start, '%Y-%m-%dT%H:%M:%S')
+    diff = datetime.utcnow() - start_dt
+    
+    # Formátování (např. "2h 15m" nebo "3 days")
+    days = diff.days
+    hours, remainder = divmod(diff.seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    
+    if days > 0:
+        return f"{days}d {hours}h"
+    elif hours > 0:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m"
+
+def _format_ps_etime(mc_uptime_raw):
+    # Formátování ps výstupu (např. 01:23:45 nebo 45:12 nebo 1-02:03:04)
+    if not mc_uptime_raw:
+        return "Offline"
+    parts = mc_uptime_raw.split(':')
+    if len(parts) == 2: # mm:ss
+        m, s = int(parts[0]), int(parts[1])
+        return f"{m}m" if m > 0 else f"{s}s"
+    elif len(parts) == 3: # hh:mm:ss nebo d-hh:mm:ss
+        if '-' in parts[0]:
+            d, h = parts[0].split('-')
+            return f"{int(d)}d {int(h)}h"
+        h, m = int(parts[0]), int(parts[1])
+        return f"{h}h {m}m"
+    return mc_uptime_raw
+
+def _mc_uptime(docker_start, java_etime):
+    if docker_start and not docker_start.startswith("Error"):
+        try:
+            return _format_docker_uptime(docker_start)
+        except Exception as e:
+            print(f"Docker uptime parse error: {e}")
+            return "N/A"
+    # Fallback na ps (pokud není docker nebo selže)
+    return _format_ps_etime(java_etime)
+
+def _probe_hw_batch(client, stats, container_name):
+    """Jeden round trip: shell skript na hostiteli vrátí všechny metriky jako JSON."""
+    script = f"CONTAINER={shlex.quote(container_name)}\n" + HW_PROBE_SCRIPT
+    stdin, stdout, stderr = client.exec_command(f"sh -c {shlex.quote(script)}", timeout=10)
+    data = json.loads(stdout.read().decode('utf8', errors='ignore').strip())
+
+    if len(data.get('mem', [])) == 2:
+        used, total = int(data['mem'][0]), int(data['mem'][1])
+        stats['ram_detail'] = f"{used}/{total} MB"
+        stats['ram_pct'] = round((used * 100) / total, 1) if total else 0
+        stats['ram_total_gb'] = round(total / 1024, 1)
+    if len(data.get('disk', [])) == 2:
+        stats['disk'], stats['disk_free'] = data['disk']
+    else:
+        stats['disk'] = 'N/A'
+        stats['disk_free'] = 'N/A'
+    stats['uptime'] = data.get('uptime') or 'N/A'
+    stats['hostname'] = data.get('hostname') or 'N/A'
+    stats['ip'] = data.get('ip') or 'N/A'
+    stats['mc_uptime'] = _mc_uptime(data.get('docker_start'), data.get('java_etime'))
+    stats['cpu_pct'] = _cpu_pct_from_sample([int(x) for x in data['cpu']])
+    stats['cpu_cores'] = int(data.get('cores') or 0)
+
+def _probe_hw_legacy(client, stats, container_name):
+    """Původní sekvence příkazů - fallback pro hostitele, kde batch skript selže."""
+    # RAM Detail: "Used/Total MB" a procenta pro graf
+    stdin, stdout, stderr = client.exec_command("free -m | awk 'NR==2{print $3,$2}'")
+    ram_raw = stdout.read().decode().strip().split()
+    if len(ram_raw) == 2:
+        used, total = int(ram_raw[0]), int(ram_raw[1])
+        stats['ram_detail'] = f"{used}/{total} MB"
+        stats['ram_pct'] = round((used * 100) / total, 1)
+        stats['ram_total_gb'] = round(total / 1024, 1)  # Convert MB to GB
+
+    stdin, stdout, stderr = client.exec_command("df -h / | tail -1 | awk '{print $5,$4}'")
+    disk_output = stdout.read().decode().strip().split()
+    if len(disk_output) == 2:
+        stats['disk'] = disk_output[0]  # Percentage (e.g., "18%")
+        stats['disk_free'] = disk_output[1]  # Free space (e.g., "45G")
+    else:
+        stats['disk'] = 'N/A'
+        stats['disk_free'] = 'N/A'
+    
+    stdin, stdout, stderr = client.exec_command("uptime -p")
+    stats['uptime'] = stdout.read().decode().strip().replace("up ", "")
+
+    stdin, stdout, stderr = client.exec_command("hostname")
+    stats['hostname'] = stdout.read().decode().strip()
+
+    stdin, stdout, stderr = client.exec_command("hostname -I | awk '{print $1}'")
+    stats['ip'] = stdout.read().decode().strip()
+    
+    # MC Process Uptime (Java) - zkusíme docker inspect pro přesný čas startu kontejneru
+    stdin, stdout, stderr = client.exec_command(f"docker inspect -f '{{{{.State.StartedAt}}}}' {container_name}")
+    docker_start = stdout.read().decode().strip()
+    java_etime = ''
+    if not docker_start or docker_start.startswith("Error"):
+        stdin, stdout, stderr = client.exec_command("ps -eo etime,comm | grep -i java | head -1 | awk '{print $1}'")
+        java_etime = stdout.read().decode().strip()
+    stats['mc_uptime'] = _mc_uptime(docker_start, java_etime)
+    
+    # CPU Usage - /proc/stat delta (bez blokujícího mpstat 1 1)
+    stdin, stdout, stderr = client.exec_command("head -1 /proc/stat")
+    try:
+        fields = [int(x) for x in stdout.read().decode().split()[1:9]]
+        stats['cpu_pct'] = _cpu_pct_from_sample(fields)
+    except:
+        stats['cpu_pct'] = 0
+        stats['cpu_unknown'] = True
+    
+    # CPU Core Count
+    stdin, stdout, stderr = client.exec_command("nproc")
+    cpu_cores_raw = stdout.read().decode().strip()
+    try:
+        stats['cpu_cores'] = int(cpu_cores_raw)
+    except:
+        stats['cpu_cores'] = 0
+
 def get_hw_stats():
     if MOCK_MODE:
         return {
@@ -372,7 +1246,8 @@ def get_hw_stats():
             'ram_detail': "4/16 GB", 
             'disk': "18%", 
             'uptime': "3 days", 
-            'cpu_pct': 12.5
+            'cpu_pct': 12.5,
+            'probed': True
         }
     
     stats = {
@@ -384,113 +1259,23 @@ def get_hw_stats():
         'cpu_pct': 0,
         'cpu_cores': 0,
         'hostname': 'N/A',
-        'ip': 'N/A'
+        'ip': 'N/A',
+        'probed': False  # False = SSH nedostupné, nulové hodnoty jsou jen výplň pro dashboard
     }
     
     client = get_ssh_client()
     if client:
+        container_name = os.environ.get('MC_CONTAINER_NAME', 'informatika')
         try:
-            # RAM Detail: "Used/Total MB" a procenta pro graf
-            stdin, stdout, stderr = client.exec_command("free -m | awk 'NR==2{print $3,$2}'")
-            ram_raw = stdout.read().decode().strip().split()
-            if len(ram_raw) == 2:
-                used, total = int(ram_raw[0]), int(ram_raw[1])
-                stats['ram_detail'] = f"{used}/{total} MB"
-                stats['ram_pct'] = round((used * 100) / total, 1)
-                stats['ram_total_gb'] = round(total / 1024, 1)  # Convert MB to GB
-
-            stdin, stdout, stderr = client.exec_command("df -h / | tail -1 | awk '{print $5,$4}'")
-            disk_output = stdout.read().decode().strip().split()
-            if len(disk_output) == 2:
-                stats['disk'] = disk_output[0]  # Percentage (e.g., "18%")
-                stats['disk_free'] = disk_output[1]  # Free space (e.g., "45G")
-            else:
-                stats['disk'] = 'N/A'
-                stats['disk_free'] = 'N/A'
-            
-            stdin, stdout, stderr = client.exec_command("uptime -p")
-            stats['uptime'] = stdout.read().decode().strip().replace("up ", "")
-
-            stdin, stdout, stderr = client.exec_command("hostname")
-            stats['hostname'] = stdout.read().decode().strip()
-
-            stdin, stdout, stderr = client.exec_command("hostname -I | awk '{print $1}'")
-            stats['ip'] = stdout.read().decode().strip()
-            
-            # MC Process Uptime (Java) - zkusíme najít čas běhu kontejneru nebo java procesu
-            container_name = os.environ.get('MC_CONTAINER_NAME', 'informatika')
-            # Zkusíme docker inspect pro přesný čas startu kontejneru
-            stdin, stdout, stderr = client.exec_command(f"docker inspect -f '{{{{.State.StartedAt}}}}' {container_name}")
-            docker_start = stdout.read().decode().strip()
-            
-            if docker_start and not docker_start.startswith("Error"):
+            if HW_PROBE_MODE == 'batch':
                 try:
-                    # Docker vrací ISO formát: 2024-01-29T10:00:00.123456789Z
-                    # Ořízneme nanosekundy pro jednodušší parsování
-                    clean_start = docker_start.split('.')[0]
-                    start_dt = datetime.strptime(clean_start, '%Y-%m-%dT%H:%M:%S')
-                    diff = datetime.utcnow() - start_dt
-                    
-                    # Formátování (např. "2h 15m" nebo "3 days")
-                    days = diff.days
-                    hours, remainder = divmod(diff.seconds, 3600)
-                    minutes, seconds = divmod(remainder, 60)
-                    
-                    if days > 0:
-                        stats['mc_uptime'] = f"{days}d {hours}h"
-                    elif hours > 0:
-                        stats['mc_uptime'] = f"{hours}h {minutes}m"
-                    else:
-                        stats['mc_uptime'] = f"{minutes}m"
-                except Exception as e:
-                    print(f"Docker uptime parse error: {e}")
-                    stats['mc_uptime'] = "N/A"
-            else:
-                # Fallback na ps (pokud není docker nebo selže)
-                stdin, stdout, stderr = client.exec_command("ps -eo etime,comm | grep -i java | head -1 | awk '{print $1}'")
-                mc_uptime_raw = stdout.read().decode().strip()
-                
-                # Formátování ps výstupu (např. 01:23:45 nebo 45:12 nebo 1-02:03:04)
-                if mc_uptime_raw:
-                    parts = mc_uptime_raw.split(':')
-                    if len(parts) == 2: # mm:ss
-                        m, s = int(parts[0]), int(parts[1])
-                        stats['mc_uptime'] = f"{m}m" if m > 0 else f"{s}s"
-                    elif len(parts) == 3: # hh:mm:ss
-                        h, m = int(parts[0]), int(parts[1])
-                        if '-' in str(h): # d-hh
-                            d_h = str(h).split('-')
-                            stats['mc_uptime'] = f"{d_h[0]}d {d_h[1]}h"
-                        else:
-                            stats['mc_uptime'] = f"{h}h {m}m"
-                    else:
-                        stats['mc_uptime'] = mc_uptime_raw
-                else:
-                    stats['mc_uptime'] = "Offline"
-            
-            # CPU Usage - using mpstat for more accurate readings
-            # Try mpstat first (more accurate), fallback to top
-            stdin, stdout, stderr = client.exec_command("mpstat 1 1 | awk '/Average/ {print 100 - $NF}'")
-            cpu_raw = stdout.read().decode().strip().replace(',', '.')
-            
-            # If mpstat fails, try top as fallback
-            if not cpu_raw or cpu_raw == "100":
-                stdin, stdout, stderr = client.exec_command("top -bn1 | grep 'Cpu(s)' | awk '{print 100 - $8}'")
-                cpu_raw = stdout.read().decode().strip().replace(',', '.')
-            
-            try:
-                stats['cpu_pct'] = round(float(cpu_raw), 1)  # Round to 1 decimal
-            except:
-                stats['cpu_pct'] = 0
-            
-            # CPU Core Count
-            stdin, stdout, stderr = client.exec_command("nproc")
-            cpu_cores_raw = stdout.read().decode().strip()
-            try:
-                stats['cpu_cores'] = int(cpu_cores_raw)
-            except:
-                stats['cpu_cores'] = 0
-                
+                    _probe_hw_batch(client, stats, container_name)
+                    stats['probed'] = True
+                    return stats
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"HW batch probe failed ({e}), falling back to sequential commands")
+            _probe_hw_legacy(client, stats, container_name)
+            stats['probed'] = True
         except Exception as e:
             print(f"HW Stats Error: {e}")
         finally:
@@ -498,7 +1283,222 @@ def get_hw_stats():
     return stats
 
 # --- RCON HELPER ---
+# --- RCON CIRCUIT BREAKER ---
+# Když MC server neběží, každý dotaz by čekal 5 s na connect. Po několika chybách
+# v řadě breaker "otevře" a dotazy okamžitě selžou; po uplynutí (exponenciálně
+# rostoucí, náhodně rozházené) pauzy pustí jeden zkušební dotaz (half-open).
+RCON_BREAKER_THRESHOLD = int(os.environ.get('RCON_BREAKER_THRESHOLD', 3))
+RCON_BREAKER_BASE_DELAY = float(os.environ.get('RCON_BREAKER_BASE_DELAY', 2))
+RCON_BREAKER_MAX_DELAY = float(os.environ.get('RCON_BREAKER_MAX_DELAY', 60))
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=3, base_delay=2, max_delay=60):
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self.state = 'closed'
+        self._failures = 0
+        self._trips = 0          # otevření po sobě bez úspěchu -> exponent backoffu
+        self._open_until = 0
+        self._last_error = None
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.time() >= self._open_until:
+                self.state = 'half_open'  # pustíme právě jeden zkušební dotaz
+                return True
+            return False
+
+    def retry_in(self):
+        return max(0, round(self._open_until - time.time(), 1))
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+            self._trips = 0
+            self._last_error = None
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self._failures += 1
+            self._last_error = str(error) if error else None
+            # Už otevřený breaker znovu neotevírat - souběžné chyby by jinak násobily backoff
+            if self.state == 'half_open' or (self.state == 'closed' and self._failures >= self.failure_threshold):
+                self._trip_locked()
+
+    def release_probe(self):
+        """Zkušební dotaz se k serveru vůbec nedostal -> half_open zpět na open (bez nového backoffu)."""
+        with self._lock:
+            if self.state == 'half_open':
+                self.state = 'open'
+
+    def _trip_locked(self):
+        self._trips += 1
+        delay = min(self.max_delay, self.base_delay * 2 ** (self._trips - 1))
+        delay *= random.uniform(0.8, 1.2)  # jitter, ať se pokusy z více vláken nesejdou
+        self.state = 'open'
+        self._open_until = time.time() + delay
+
+    def trip(self):
+        """Okamžitě otevře (např. po vypnutí serveru)."""
+        with self._lock:
+            self._trip_locked()
+
+    def reset(self):
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+            self._trips = 0
+            self._open_until = 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self._failures,
+                'retry_in': self.retry_in() if self.state == 'open' else 0,
+                'last_error': self._last_error
+            }
+
+RCON_BREAKER = CircuitBreaker(RCON_BREAKER_THRESHOLD, RCON_BREAKER_BASE_DELAY, RCON_BREAKER_MAX_DELAY)
+
+# --- RCON QUERY CACHE ---
+# Read-only dotazy (list, tps...) posílá stats sampler, seznam hráčů i tracker zároveň.
+# Souběžní volající sdílí jeden rozběhnutý dotaz (single-flight) a výsledek se krátce
+# cachuje. Mutující příkazy (ban, whitelist add...) invalidují související záznamy.
+def _parse_cache_ttls(raw):
+    ttls = {}
+    for item in raw.split(','):
+        if '=' in item:
+            cmd, ttl = item.rsplit('=', 1)
+            ttls[' '.join(cmd.split()).lower()] = float(ttl)
+    return ttls
+
+RCON_CACHE_TTLS = _parse_cache_ttls(os.environ.get(
+    'RCON_CACHE_TTLS', 'list=2,tps=5,whitelist list=10,banlist players=10,pl=30'))
+
+# první slovo mutujícího příkazu -> cachované dotazy, které tím přestanou platit (None = vše).
+# Namespace (minecraft:, essentials:) a Essentials alias s předponou "e" (eban, eunbanip...)
+# se před vyhledáním odstraní, viz RCONQueryCache._command_word.
+RCON_CACHE_INVALIDATES = {
+    'kick': ('list',),
+    'kickall': ('list',),
+    'ban': ('banlist players', 'list'),
+    'tempban': ('banlist players', 'list'),
+    'pardon': ('banlist players',),
+    'unban': ('banlist players',),
+    # IP bany vyhodí i hráče z dané IP; vanilla i Essentials varianty
+    'ban-ip': ('banlist ips', 'banlist players', 'list'),
+    'banip': ('banlist ips', 'banlist players', 'list'),
+    'ipban': ('banlist ips', 'banlist players', 'list'),
+    'tempbanip': ('banlist ips', 'banlist players', 'list'),
+    'pardon-ip': ('banlist ips', 'banlist players'),
+    'pardonip': ('banlist ips', 'banlist players'),
+    'unbanip': ('banlist ips', 'banlist players'),
+    'unipban': ('banlist ips', 'banlist players'),
+    'whitelist': ('whitelist list',),
+    'plugman': ('pl',),
+    'reload': None,
+    'stop': None,
+    'restart': None,
+}
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+class RCONQueryCache:
+    def __init__(self, ttls, invalidates):
+        self.ttls = ttls
+        self.invalidates = invalidates
+        self._lock = threading.Lock()
+        self._entries = {}     # dotaz -> (expires_at, odpověď)
+        self._inflight = {}    # dotaz -> _Flight
+        self._generation = 0   # zvýší se při invalidaci, aby rozběhnutý dotaz neuložil starý stav
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'invalidations': 0}
+
+    @staticmethod
+    def _key(command):
+        return ' '.join(command.split()).lower()
+
+    def get(self, command, fetch):
+        key = self._key(command)
+        ttl = self.ttls.get(key)
+        if ttl is None:
+            result = fetch(command)
+            self.invalidate_for(command)
+            return result
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.time():
+                self._stats['hits'] += 1
+                return entry[1]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                generation = self._generation
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight.event.wait()
+            return flight.result
+
+        result = None
+        try:
+            result = fetch(command)
+            return result
+        finally:
+            with self._lock:
+                if result is not None and not result.startswith("Error") and generation == self._generation:
+                    self._entries[key] = (time.time() + ttl, result)
+                self._inflight.pop(key, None)
+            flight.result = result if result is not None else "Error: query failed"
+            flight.event.set()
+
+    def _command_word(self, command):
+        """'/minecraft:ban X' -> 'ban', 'essentials:eunbanip X' -> 'unbanip'; None pro nemutující příkaz."""
+        words = self._key(command).lstrip('/').split()
+        if not words: return None
+        word = words[0].rsplit(':', 1)[-1]
+        if word not in self.invalidates and word.startswith('e') and word[1:] in self.invalidates:
+            word = word[1:]
+        return word if word in self.invalidates else None
+
+    def invalidate_for(self, command):
+        word = self._command_word(command)
+        if word is None: return
+        self.invalidate(self.invalidates[word])
+
+    def invalidate(self, targets=None):
+        """Zahodí zadané dotazy (None = celou cache)."""
+        with self._lock:
+            self._generation += 1
+            self._stats['invalidations'] += 1
+            if targets is None:
+                self._entries.clear()
+            else:
+                for target in targets: self._entries.pop(target, None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), inflight=len(self._inflight))
+
+RCON_CACHE = RCONQueryCache(RCON_CACHE_TTLS, RCON_CACHE_INVALIDATES)
+
 def get_rcon_response(command):
+    """Pošle příkaz přes RCON. Read-only dotazy z RCON_CACHE_TTLS jdou přes cache."""
+    return RCON_CACHE.get(command, _rcon_execute)
+
+def _rcon_execute(command):
     global MOCK_PLAYERS, MOCK_LOGS
     
     if MOCK_MODE:
@@ -506,7 +1506,7 @@ def get_rcon_response(command):
         response = "Unknown command"
         if command == "list":
             names = [p['name'] for p in MOCK_PLAYERS]
-            response = f"There are {len(names)} of 20 players online: {', '.join(names)}"
+            response = f"There are {len(names)} of a max of 20 players online: {', '.join(names)}"
         elif command.startswith("kick "):
             target = command.split(' ')[1]
             MOCK_PLAYERS = [p for p in MOCK_PLAYERS if p['name'] != target]
@@ -515,148 +1515,532 @@ def get_rcon_response(command):
              target = command.split(' ')[1]
              MOCK_PLAYERS = [p for p in MOCK_PLAYERS if p['name'] != target]
              response = f"Banned {target}"
+        elif command.startswith("banlist"): response = "There are no bans"
         elif command == "tps": response = "TPS: 20.0"
         elif command == "pl": response = "Plugins: CoreProtect, Essentials"
         else: response = "Command executed (Mock)"
         MOCK_LOGS.append(response)
         return response
 
+    if not RCON_BREAKER.allow():
+        return f"Error: RCON nedostupný (další pokus za {RCON_BREAKER.retry_in()} s)"
+
     try:
-        # POUŽITÍ GLOBÁLNÍHO RCONU S LOCKEM
-        # Zkontrolujeme, zda se nezměnil stav tunelu (např. spadl a nahodil se na jiném portu?)
-        # Pro jednoduchost předpokládáme, že pokud tunel běží, používáme jeho port.
-        
-        with RCON_LOCK:
-            rcon = get_global_rcon()
-            return rcon.command(command)
+        # Spojení z poolu (pool sám hlídá změnu konfigurace i portu tunelu)
+        with RCON_POOL.connection() as rcon:
+            response = rcon.command(command)
+        RCON_BREAKER.record_success()
+        return response
 
+    except RCONPoolExhausted as e:
+        RCON_BREAKER.release_probe()
+        print(f"RCON Error: {e}", file=sys.stderr)
+        return f"Error: {e}"
     except Exception as e:
-        # Pokud dojde k chybě, možná je třeba resetovat globální instanci příště
-        global GLOBAL_RCON
-        GLOBAL_RCON = None # Force recreation next time
-        import traceback
-        import sys
-        # traceback.print_exc(file=sys.stderr) # Uncomment for debug
+        # Rozbité spojení pool sám zahodí, příště se vytvoří nové
+        RCON_BREAKER.record_failure(e)
         print(f"RCON Error: {e}", file=sys.stderr)
         return f"Error: {e}"
 
-def parse_players(list_output):
-    """Robustně parsuje hráče z příkazu 'list'."""
-    if not list_output: return []
-    
-    # Vyčištění od MC formátování (§a, §l atd.) - nahradit mezerou
-    output = clean_mc_string(list_output)
-    
-    # Strategie: Najít všechna slova, která NEJSOU následována dvojtečkou (Group names)
-    # a která NEJSOU v blacklistu běžných slov.
-    
-    SKIP_WORDS = {
-        'there', 'are', 'of', 'max', 'maximum', 'players', 'online', 'server', 
-        'total', 'list', 'connected', 'and', 'or', 'in', 'out', 'from'
-    }
-    
-    # Regex: slovo 3-16 znaků.
-    # Lookahead (?!\s*:) zajistí, že za slovem není dvojtečka (nepovinné mezery mezitím)
-    potential_matches = re.findall(r'\b([a-zA-Z0-9_]{3,16})\b(?!\s*:)', output)
-    
-    valid_names = []
-    for name in potential_matches:
-        if name.lower() not in SKIP_WORDS:
-            valid_names.append(name)
-            
-    print(f"DEBUG: Parsed players from '{output[:50]}...': {valid_names}")
-    return sorted(list(set(valid_names)))
+# --- ASYNC RCON (BATCHE PŘÍKAZŮ) ---
+# Hromadné akce (freeze_all, clear_chat_all...) pošleme pipelined po jednom spojení
+# a na odpovědi čekáme souběžně, takže N příkazů trvá zhruba jeden round trip.
+# Asyncio smyčka běží v jednom vlákně na pozadí, Flask handlery volají rcon_batch().
+RCON_BATCH_TIMEOUT = float(os.environ.get('RCON_BATCH_TIMEOUT', 5))
 
+class AsyncRCON:
+    def __init__(self, host, password, port=25575):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.request_id = random.randint(1, 1 << 30)
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._pending = {}    # request_id -> (future, chunks)
+        self._sentinels = {}  # sentinel_id -> request_id příkazu
+        self._connect_lock = asyncio.Lock()  # souběžné batche se připojují jen jednou
 
-def parse_banlist(banlist_output):
-    """Ultra-robustní parsování banlistu s podporou pro více jmen na řádku."""
-    if not banlist_output: return []
-    
-    # Vyčištění od barev a rozdělení na řádky
-    output = clean_mc_string(banlist_output)
-    
-    found_names = set()
-    
-    # 1. Zkusíme parsrovat Essentials formát: "Player was banned by Admin: Reason"
-    # Díky úpravě clean_mc_string jsou slova oddělena mezerami, i když tam byly barvy.
-    # Pattern: slovo následované " was banned by"
-    # \b(\w+) was banned by
-    # Zvýšen limit na 50 znaků, protože jména mohou být slepená s předchozím slovem (např. serveruJirka)
-    essentials_matches = re.findall(r'\b([a-zA-Z0-9_]{3,50})\s+was banned by', output)
-    if essentials_matches:
-        for name in essentials_matches:
-            # Fix pro slepená jména (specifický problém "Pravidla serveruNAME")
-            # Pokud jméno začíná na "serveru" a následuje Velké Písmeno, ořízneme "serveru".
-            if name.startswith('serveru') and len(name) > 7 and name[7].isupper():
-                name = name[7:]
-                
-            # Validace délky MC jména (3-16 znaků)
-            if 3 <= len(name) <= 16:
-                found_names.add(name)
-            
-    # 2. Pokud nic nenajdeme, zkusíme Vanilla formát: "There are X banned players: name1, name2"
-    elif ':' in output and "banned players" in output:
-        names_part = output.split(':')[-1].strip()
-        names = [n.strip() for n in names_part.split(',')]
-        for name in names:
-            if re.match(r'^[a-zA-Z0-9_]{3,16}$', name):
-                found_names.add(name)
-    
-    # Fallback: Stará agresivní metoda (jen pokud předchozí nic nenašly)
-    if not found_names:
-        lines = [line.strip() for line in output.split('\n') if line.strip()]
-        mc_name_re = re.compile(r'\b([a-zA-Z0-9_]{3,16})\b')
-        blacklisted_words = {
-            'online', 'banned', 'players', 'there', 'reason', 'rules', 'server', 
-            'player', 'list', 'names', 'none', 'error', 'was', 'were', 'has', 'have',
-            'are', 'is', 'total', 'and', 'with', 'for', 'by', 'console'
-        }
-        for line in lines:
-            matches = mc_name_re.findall(line)
-            for m in matches:
-                if m.lower() not in blacklisted_words:
-                    found_names.add(m)
-                    
-    return sorted(list(found_names))
+    @property
+    def connected(self):
+        # Spojení je použitelné až po autentizaci (pak teprve běží čtecí smyčka)
+        return (self._writer is not None and not self._writer.is_closing()
+                and self._reader_task is not None and not self._reader_task.done())
 
+    def _new_id(self):
+        self.request_id = self.request_id % 2147483646 + 1
+        return self.request_id
 
-    
-    for line in lines:
-        if "no banned players" in line.lower(): continue
-        
-        # Extrahujeme VŠECHNA potenciální jména z řádku
-        candidates = mc_name_re.findall(line)
-        for name in candidates:
-            if name.lower() not in blacklisted_words:
-                found_names.add(name)
+    async def _read_packet(self):
+        in_len = struct.unpack('<i', await self._reader.readexactly(4))[0]
+        in_payload = await self._reader.readexactly(in_len)
+        in_id, in_type = struct.unpack('<ii', in_payload[0:8])
+        return in_id, in_type, in_payload[8:-2]
 
-    return sorted(list(found_names))
+    async def connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), 5)
+        auth_id = self._new_id()
+        self._writer.write(rcon_packet(auth_id, 3, self.password))
+        await self._writer.drain()
+        in_id, in_type, _ = await asyncio.wait_for(self._read_packet(), 5)
+        if in_type == 0:
+            in_id, in_type, _ = await asyncio.wait_for(self._read_packet(), 5)
+        if in_id == -1:
+            self.close()
+            raise Exception("RCON authentication failed")
+        self._reader_task = asyncio.ensure_future(self._read_loop())
 
+    async def _read_loop(self):
+        try:
+            while True:
+                in_id, in_type, body = await self._read_packet()
+                if in_id in self._sentinels:
+                    entry = self._pending.pop(self._sentinels.pop(in_id), None)
+                    if entry and not entry[0].done():
+                        entry[0].set_result(b''.join(entry[1]).decode('utf8', errors='ignore'))
+                elif in_id in self._pending:
+                    self._pending[in_id][1].append(body)
+        except Exception as e:
+            self.close(f"Connection closed ({e})")
+
+    def close(self, reason="Connection closed"):
+        """Zavře socket, ukončí čtecí smyčku a selže všechny čekající příkazy."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        task, self._reader_task = self._reader_task, None
+        if task is not None and not task.done() and task is not asyncio.current_task():
+            task.cancel()
+        for fut, _ in self._pending.values():
+            if not fut.done(): fut.set_exception(Exception(reason))
+        self._pending.clear()
+        self._sentinels.clear()
+
+    async def execute_batch(self, cmds, timeout=5):
+        """Pošle všechny příkazy naráz a vrátí odpovědi ve stejném pořadí ("Error: ..." při chybě/timeoutu)."""
+        if not self.connected:
+            async with self._connect_lock:
+                if not self.connected:
+                    self.close()  # případný polomrtvý socket a jeho čtecí smyčka
+                    await self.connect()
+        loop = asyncio.get_running_loop()
+        futures, ids = [], []
+        out = b''
+        for cmd in cmds:
+            cmd_id, sentinel_id = self._new_id(), self._new_id()
+            fut = loop.create_future()
+            self._pending[cmd_id] = (fut, [])
+            self._sentinels[sentinel_id] = cmd_id
+            out += rcon_packet(cmd_id, 2, cmd) + rcon_packet(sentinel_id, RCON_SENTINEL_TYPE, '')
+            futures.append(fut)
+            ids.append((cmd_id, sentinel_id))
+        try:
+            self._writer.write(out)
+            await self._writer.drain()
+            results = await asyncio.gather(*(asyncio.wait_for(f, timeout) for f in futures),
+                                           return_exceptions=True)
+        finally:
+            # Po timeoutu/zrušení by záznamy jinak zůstaly viset (a pozdní odpověď by je hledala)
+            for cmd_id, sentinel_id in ids:
+                self._pending.pop(cmd_id, None)
+                self._sentinels.pop(sentinel_id, None)
+        return [r if isinstance(r, str) else f"Error: {str(r) or 'timeout'}" for r in results]
+
+class AsyncRCONRunner:
+    """Drží asyncio smyčku ve vlákně na pozadí a jedno AsyncRCON spojení na ní."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._client = None
+        self._params = None
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        return self._loop
+
+    async def _execute(self, params, cmds, timeout):
+        if self._client is None or params != self._params:
+            if self._client: self._client.close()
+            host, port, password = params
+            self._client = AsyncRCON(host, password, port=port)
+            self._params = params
+        client = self._client
+        try:
+            return await client.execute_batch(cmds, timeout)
+        except Exception as e:
+            client.close(str(e))
+            if self._client is client:
+                self._client = None
+            return [f"Error: {e}"] * len(cmds)
+
+    async def _close(self):
+        if self._client: self._client.close()
+        self._client = None
+
+    def execute_batch(self, params, cmds, timeout):
+        loop = self._ensure_loop()
+        fut = asyncio.run_coroutine_threadsafe(self._execute(params, cmds, timeout), loop)
+        return fut.result(timeout + 15)  # + connect a autentizace
+
+    def reset(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._close(), self._loop)
+
+ASYNC_RCON = AsyncRCONRunner()
+
+def rcon_batch(commands, timeout=None):
+    """Synchronní wrapper pro Flask: provede příkazy (pipelined, u RCON_PROTOCOL=simple postupně) a vrátí seznam odpovědí."""
+    commands = list(commands)
+    # RCON_PROTOCOL=simple: server neodpovídá na sentinel pakety, AsyncRCON by vždy čekal do timeoutu
+    # -> příkazy postupně přes pool (a breaker/cache invalidaci v get_rcon_response)
+    if MOCK_MODE or not commands or RCON_PROTOCOL == 'simple':
+        return [get_rcon_response(cmd) for cmd in commands]
+    if not RCON_BREAKER.allow():
+        return [f"Error: RCON nedostupný (další pokus za {RCON_BREAKER.retry_in()} s)"] * len(commands)
+    try:
+        params = RCON_POOL._resolve_params()
+        results = ASYNC_RCON.execute_batch(params, commands, timeout or RCON_BATCH_TIMEOUT)
+        if all(r.startswith("Error") for r in results):
+            RCON_BREAKER.record_failure(results[0])
+        else:
+            RCON_BREAKER.record_success()
+        return results
+    except Exception as e:
+        RCON_BREAKER.record_failure(e)
+        print(f"RCON Batch Error: {e}", file=sys.stderr)
+        return [f"Error: {e}"] * len(commands)
+    finally:
+        for cmd in commands: RCON_CACHE.invalidate_for(cmd)
+
+# --- COMMAND CAPABILITIES ---
+# Různé servery (vanilla, Paper, Essentials...) umí různé varianty téhož příkazu.
+# Místo zkoušení všech variant při každém kliknutí si zapamatujeme, která varianta
+# na připojeném serveru prošla, a příště ji pošleme rovnou. Po přepnutí pluginu,
+# restartu serveru nebo změně konfigurace se paměť zahodí.
+SPAWN_VARIANTS = (
+    "spawn {player}",
+    "essentials:spawn {player}",
+    "execute as {player} run spawn",
+    # Poslední záchrana - teleport na souřadnice 0, 100, 0 v Overworldu
+    # Používáme execute, aby to fungovalo i z Netheru
+    "execute in minecraft:overworld run tp {player} 0 100 0",
+)
+FEED_VARIANTS = (
+    "feed {player}",
+    # Fallback na vanilla saturation
+    "effect give {player} minecraft:saturation 1 255",
+)
+GIVE_VARIANTS = (
+    "give {player} {item} {count}",
+    "essentials:give {player} {item} {count}",
+)
+
+# Jen hlášky "varianta neexistuje" (vanilla "Unknown or incomplete command", Bukkit "Unknown command.").
+# "Unknown item", "No player was found" apod. říkají, že příkaz existuje, jen nesedí argumenty.
+# "Incorrect argument for command" = příkaz existuje, ale se syntaxí této varianty ne -> zkusit další.
+UNSUPPORTED_RE = re.compile(r'unknown (?:or incomplete )?command|incomplete command|incorrect argument', re.IGNORECASE)
+ARGUMENT_ERROR_RE = re.compile(r'unknown (?:item|player|entity|effect)|no (?:player|entity) was found'
+                               r'|player not found|not online', re.IGNORECASE)
+
+def is_unsupported_response(resp):
+    return bool(UNSUPPORTED_RE.search(resp))
+
+def is_argument_error(resp):
+    return bool(ARGUMENT_ERROR_RE.search(resp))
+
+class CommandCapabilities:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._known = {}  # (server, capability) -> index podporované varianty
 
+    def _server_key(self):
+        if MOCK_MODE: return ('mock',)
+        host, port, _ = RCON_POOL._resolve_params()
+        return (host, port)
 
+    def known_command(self, capability, variants, **kwargs):
+        """Vrátí naformátovanou známou variantu, nebo None pokud ji zatím neznáme."""
+        with self._lock:
+            index = self._known.get((self._server_key(), capability))
+        return variants[index].format(**kwargs) if index is not None else None
 
+    def run(self, capability, variants, **kwargs):
+        """Provede příkaz podporovanou variantou. Vrací (odpověď, index varianty)."""
+        key = (self._server_key(), capability)
+        with self._lock:
+            start = self._known.get(key)
+        if start is not None:
+            resp = get_rcon_response(variants[start].format(**kwargs))
+            if not is_unsupported_response(resp):
+                return resp, start
+            # Plugin mezitím zmizel -> učíme se znovu
+            with self._lock:
+                self._known.pop(key, None)
 
+        resp, index = "", 0
+        for index, template in enumerate(variants):
+            resp = get_rcon_response(template.format(**kwargs))
+            print(f"[DEBUG-ACTION] {capability} variant {index + 1}: {resp}")
+            if resp.startswith("Error") or is_argument_error(resp):
+                # Chyba spojení / špatný argument (překlep v itemu, offline hráč) neříká nic o podpoře
+                # příkazu a další varianta by dopadla stejně -> vrátit, ale nepamatovat si
+                return resp, index
+            if not is_unsupported_response(resp):
+                # Příkaz prošel - jen tehdy je varianta prokazatelně podporovaná
+                with self._lock:
+                    self._known[key] = index
+                return resp, index
+        return resp, index  # žádná varianta neexistuje; nic se neukládá, příště se zkusí znovu
 
+    def invalidate(self):
+        with self._lock:
+            self._known.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {cap: index for (_, cap), index in self._known.items()}
+
+COMMAND_CAPS = CommandCapabilities()
+
+# --- RCON OUTPUT PARSERS ---
+# Výstup `list` / `banlist players` se liší podle serveru (vanilla/Paper, starý Bukkit,
+# EssentialsX se skupinami). Každý formát má předkompilovanou gramatiku; formát se
+# rozpozná podle hlavičky jednou a pro další dotazy se zkouší rovnou (do reconnectu /
+# změny pluginů). Parsuje se do záznamů, ne hádáním slov podle blacklistu.
+PlayerEntry = collections.namedtuple('PlayerEntry', 'name group afk')
+BanEntry = collections.namedtuple('BanEntry', 'name source reason')
+
+MC_NAME_RE = re.compile(r'[A-Za-z0-9_]{3,16}')
+MC_NAME_CHARS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_'
+# Položka seznamu "a, b, c"; u `list uuids` za jménem následuje " (uuid)"
+LIST_NAMES_RE = re.compile(r'(?:^|,)\s*([A-Za-z0-9_]{3,16})(?![A-Za-z0-9_])')
+# Položka EssentialsX: [AFK]/[HIDDEN] tag, prefix z display name, jméno
+ESS_ENTRIES_RE = re.compile(r'(?:^|,)\s*(\[AFK\])?(?:\[HIDDEN\])?(?:[^,]*[^A-Za-z0-9_,])?([A-Za-z0-9_]{3,16})\s*(?=,|$)')
+ESS_GROUP_TAG_RE = re.compile(r'§6([^§\n]+?)§r: ')  # listGroupTag - barvy oddělují skupiny i ve slepeném výstupu
+ESS_GROUP_LINE_RE = re.compile(r'^\s*([^:\n]+?): (.*)$', re.MULTILINE)
+BAN_LINE_RE = re.compile(r'^([A-Za-z0-9_]{3,16}) was banned by ([^:\n]*): ([^\r\n]*)', re.MULTILINE)
+LOWER_UPPER_RE = re.compile(r'(?<=[a-z0-9])(?=[A-Z])')
+
+HEADER_SCAN = 256  # hlavička je na začátku výstupu; formát se pozná bez čištění celého textu
+
+def strip_mc_format(text):
+    return MC_FORMAT_RE.sub('', text) if '§' in text else text
+
+def _body(raw, header):
+    # Pozice v očištěném začátku platí i v celém očištěném textu
+    return strip_mc_format(raw)[header.end():]
+
+# Gramatiky `list` vrací (jména, {jméno: (skupina, afk)}) - seznam jmen pro běžný poll
+# se tak obejde bez stavění záznamů
+def _parse_list_plain(raw, header):
+    return LIST_NAMES_RE.findall(_body(raw, header)), {}
+
+def _essentials_entries(group, segment, names, extras):
+    for afk, name in ESS_ENTRIES_RE.findall(strip_mc_format(segment).strip()):
+        names.append(name)
+        extras[name] = (group, bool(afk))
+
+def _parse_list_essentials(raw, header):
+    names, extras = [], {}
+    start = raw.find('players online.')
+    tags = list(ESS_GROUP_TAG_RE.finditer(raw, start + 1)) if start >= 0 else []
+    if tags:
+        for tag, following in zip(tags, tags[1:] + [None]):
+            segment = raw[tag.end():following.start() if following else len(raw)]
+            _essentials_entries(tag.group(1), segment, names, extras)
+        return names, extras
+    # Bez barev (konzole/plugin je odstraní): skupina na řádek "Skupina: a, b"
+    for line in ESS_GROUP_LINE_RE.finditer(_body(raw, header)):
+        _essentials_entries(line.group(1), line.group(2), names, extras)
+    return names, extras
+
+def _glued_name(run, known_names):
+    """Jméno slepené s koncem důvodu předchozího banu ("Pravidla serveruJirka")."""
+    if known_names:
+        for start in range(max(0, len(run) - 16), len(run) - 2):
+            if run[start:] in known_names:
+                return run[start:]
+    # Neznámý hráč: první přechod malé -> velké písmeno, po kterém zbývá platné jméno
+    cut = LOWER_UPPER_RE.search(run, max(0, len(run) - 16))
+    if cut and len(run) - cut.start() >= 3:
+        return run[cut.start():]
+    return run[-16:]
+
+def _parse_bans_vanilla(raw, header, known_names=()):
+    body = _body(raw, header)
+    count = body.count(' was banned by ')
+    # Paper/Spigot posílá každý ban na vlastním řádku -> jeden findall
+    if body.count('\n') >= count:
+        lines = BAN_LINE_RE.findall(body)
+        if len(lines) == count:
+            return list(map(BanEntry._make, lines))
+    # "Jméno was banned by Zdroj: Důvod" slepené za sebou: mezi dvěma značkami je "Zdroj: Důvod" + další jméno
+    parts = body.split(' was banned by ')
+    entries = []
+    name = parts[0].strip()
+    if not MC_NAME_RE.fullmatch(name):
+        return []
+    for i, part in enumerate(parts[1:], 1):
+        source, _, rest = part.partition(': ')
+        if i < len(parts) - 1:
+            head = rest.rstrip(MC_NAME_CHARS)
+            run = rest[len(head):]
+            # Za tečkou apod. začíná jméno jistě; po slově důvodu ("Pravidla serveruJirka")
+            # může začínat kdekoli - rozhodnou známá jména, jinak velké písmeno
+            if head and head[-1] != ' ' and len(run) <= 16:
+                next_name = run
+            else:
+                next_name = _glued_name(run, known_names)
+            reason = head + run[:len(run) - len(next_name)]
+        else:
+            reason, next_name = rest, None
+        entries.append(BanEntry(name, source.strip(), reason.strip()))
+        name = next_name
+    return entries
+
+def _parse_bans_legacy(raw, header, known_names=()):
+    return [BanEntry(name, None, None) for name in LIST_NAMES_RE.findall(_body(raw, header))]
+
+def _parse_empty(raw, header, known_names=()):
+    return []
+
+# (název, hlavička po odstranění barev, parser(raw, hlavička)); pořadí = pořadí při detekci
+LIST_FORMATS = (
+    ('vanilla', re.compile(r'There are (\d+) of a max of (\d+) players online:'), _parse_list_plain),
+    ('bukkit', re.compile(r'There are (\d+)/(\d+) players online:'), _parse_list_plain),
+    ('essentials', re.compile(r'There are (\d+) out of maximum (\d+) players online\.'), _parse_list_essentials),
+)
+BANLIST_FORMATS = (
+    ('vanilla', re.compile(r'There (?:are|is) (\d+) ban\(s\):'), _parse_bans_vanilla),
+    ('legacy', re.compile(r'There are (\d+) total banned players:'), _parse_bans_legacy),
+    ('empty', re.compile(r'There are no bans'), _parse_empty),
+)
+
+class OutputFormats:
+    """Pamatuje si, kterým formátem server odpovídá, aby se nedetekovalo při každém pollu."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._known = {}  # 'list' / 'banlist' -> index ve formátech
+
+    def match(self, kind, formats, raw):
+        head = strip_mc_format(raw[:HEADER_SCAN])
+        with self._lock:
+            index = self._known.get(kind)
+        if index is not None:
+            header = formats[index][1].search(head)
+            if header:
+                return formats[index], header
+        for index, fmt in enumerate(formats):
+            header = fmt[1].search(head)
+            if header:
+                with self._lock:
+                    self._known[kind] = index
+                return fmt, header
+        return None, None
+
+    def invalidate(self):
+        with self._lock:
+            self._known.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {kind: (LIST_FORMATS if kind == 'list' else BANLIST_FORMATS)[index][0]
+                    for kind, index in self._known.items()}
+
+OUTPUT_FORMATS = OutputFormats()
+
+def _scan_player_list(list_output):
+    """(jména, doplňky), nebo None pro neznámý formát - to není totéž co "nikdo online"."""
+    if not list_output or list_output.startswith("Error"): return [], {}
+    fmt, header = OUTPUT_FORMATS.match('list', LIST_FORMATS, list_output)
+    if not fmt:
+        print(f"WARN: Neznámý formát 'list': {list_output[:80]!r}")
+        return None
+    return fmt[2](list_output, header)
 
+def parse_player_list(list_output):
+    """Rozparsuje výstup 'list' na záznamy PlayerEntry(name, group, afk); None = neznámý formát."""
+    scanned = _scan_player_list(list_output)
+    if scanned is None: return None
+    names, extras = scanned
+    return [PlayerEntry(name, *extras.get(name, (None, False))) for name in names]
+
+def parse_ban_entries(banlist_output, known_names=()):
+    """Rozparsuje výstup 'banlist players' na BanEntry(name, source, reason).
+    known_names (jména z DB) pomáhají oddělit jméno slepené s důvodem předchozího banu."""
+    if not banlist_output or banlist_output.startswith("Error"): return []
+    fmt, header = OUTPUT_FORMATS.match('banlist', BANLIST_FORMATS, banlist_output)
+    if not fmt:
+        print(f"WARN: Neznámý formát 'banlist': {banlist_output[:80]!r}")
+        return []
+    return fmt[2](banlist_output, header, known_names)
+
+def parse_players(list_output):
+    """Seřazená jména online hráčů z příkazu 'list'. None = neznámý formát (volající cyklus přeskočí)."""
+    scanned = _scan_player_list(list_output)
+    return None if scanned is None else sorted(set(scanned[0]))
+
+def parse_banlist(banlist_output, known_names=()):
+    """Seřazená jména zabanovaných hráčů z příkazu 'banlist players'."""
+    return sorted({entry.name for entry in parse_ban_entries(banlist_output, known_names)})
+
+
+
+
+
+
+
+
+LAST_SEEN_RESOLUTION = 60  # last_seen online hráčů obnovujeme nejvýš jednou za minutu
 
 def sync_players_to_db(online_names):
-    """Synchronizuje seznam online hráčů s databází."""
+    """Synchronizuje seznam online hráčů s databází - zapisuje jen skutečné změny."""
     db = get_db()
-    cursor = db.cursor()
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    now_ts = int(time.time())
+    now = datetime.fromtimestamp(now_ts).strftime("%Y-%m-%d %H:%M:%S")
     
-    # 1. Resetovat status online pro všechny
-    cursor.execute("UPDATE players SET is_online = 0")
+    # Předchozí stav = hráči, kteří jsou v DB vedeni jako online (index idx_players_online_ts)
+    previous = {row['name']: row['last_seen_ts'] or 0 for row in
+                db.execute("SELECT name, last_seen_ts FROM players WHERE is_online = 1").fetchall()}
+    online = set(online_names)
     
-    # 2. Update/Insert pro online hráče
-    for name in online_names:
-        cursor.execute("SELECT name FROM players WHERE name = ?", (name,))
-        if cursor.fetchone():
-            cursor.execute("UPDATE players SET is_online = 1, last_seen = ? WHERE name = ?", (now, name))
-        else:
-            cursor.execute("INSERT INTO players (name, first_seen, last_seen, is_online) VALUES (?, ?, ?, 1)", (name, now, now))
+    went_offline = [(name,) for name in previous.keys() - online]
+    came_online = [(name, now, now_ts, now, now_ts) for name in online - previous.keys()]
+    # Stále online: jen posunout last_seen, pokud je starší než LAST_SEEN_RESOLUTION
+    still_online = [(now, now_ts, name) for name in online & previous.keys()
+                    if previous[name] < now_ts - LAST_SEEN_RESOLUTION]
     
-    db.commit()
+    if not (went_offline or came_online or still_online):
+        return
+    
+    with db:  # jedna transakce
+        if went_offline:
+            db.executemany("UPDATE players SET is_online = 0 WHERE name = ?", went_offline)
+        if came_online:
+            db.executemany('''
+                INSERT INTO players (name, first_seen, first_seen_ts, last_seen, last_seen_ts, is_online)
+                VALUES (?, ?, ?, ?, ?, 1)
+                ON CONFLICT(name) DO UPDATE SET
+                    is_online = 1, last_seen = excluded.last_seen, last_seen_ts = excluded.last_seen_ts
+            ''', came_online)
+        if still_online:
+            db.executemany("UPDATE players SET last_seen = ?, last_seen_ts = ? WHERE name = ?", still_online)
+        bump_content_version(db, 'players')
+    
+    if went_offline or came_online:
+        joined = sorted(name for name, *_ in came_online)
+        left = sorted(name for name, in went_offline)
+        # Karty změněných hráčů jdou rovnou v události - dashboardy je jen vymění, bez /players/list
+        try:
+            cards = render_player_cards(db, joined + left)
+        except Exception as e:
+            print(f"[EVENTS-ERROR] {e}")
+            cards = None
+        EVENT_HUB.publish('players', {'joined': joined, 'left': left, 'online': sorted(online), 'cards': cards})
 
 # --- ROUTES ---
 
@@ -743,15 +2127,25 @@ def dashboard():
 @app.route('/api/wiki')
 def api_wiki():
     db = get_db()
+    # Obsah závisí na modulech, oblíbených a commands.json
+    version, last_modified = content_version(db, 'modules', 'favorites')
+    try:
+        mtime = int(os.stat('commands.json').st_mtime)
+    except OSError:
+        mtime = 0
+    token, last_modified = f"{version}.{mtime}", max(last_modified or 0, mtime) or None
+    cached = not_modified(token, last_modified)
+    if cached: return cached
+
     cursor = db.cursor()
     cursor.execute("SELECT id FROM modules WHERE enabled = 1")
     active_mods = [r['id'] for r in cursor.fetchall()]
     active_mods.append('base')
 
     data = get_grouped_commands(active_mods)
-    return render_template('partials/wiki_table.html', 
+    return with_validators(make_response(render_template('partials/wiki_table.html', 
                            grouped_commands=data['groups'], 
-                           favorites=data['favorites'])
+                           favorites=data['favorites'])), token, last_modified)
 
 @login_required
 @app.route('/api/commands/favorite/toggle', methods=['POST'])
@@ -764,82 +2158,572 @@ def toggle_favorite():
         db.execute("DELETE FROM favorite_commands WHERE command_id = ?", (cmd_id,))
     else:
         db.execute("INSERT INTO favorite_commands (command_id) VALUES (?)", (cmd_id,))
+    bump_content_version(db, 'favorites')
     db.commit()
     return jsonify({"status": "success"})
 
-@login_required
+# --- EVENT HUB (SSE) ---
+# Producenti (sampler, sync hráčů, LiveWatcher) publikují typované události jednou,
+# všechny otevřené dashboardy je dostanou jedním SSE streamem /api/events.
+EVENT_BUFFER_SIZE = int(os.environ.get('EVENT_BUFFER_SIZE', 500))
+EVENT_KEEPALIVE = 15
+EVENT_STATE_KINDS = ('stats', 'status', 'banlist')  # stavové typy - nový klient dostane poslední hodnotu
+
+class EventHub:
+    def __init__(self, size):
+        self.epoch = format(int(time.time()), 'x')  # id po restartu nenavazují na stará
+        self._cond = threading.Condition()
+        self._events = collections.deque(maxlen=size)
+        self._latest = {}
+        self._seq = 0
+        self.subscribers = 0
+
+    def publish(self, kind, data):
+        with self._cond:
+            self._seq += 1
+            event = (self._seq, kind, data)
+            self._events.append(event)
+            if kind in EVENT_STATE_KINDS:
+                self._latest[kind] = event
+            self._cond.notify_all()
+        return self._seq
+
+    def event_id(self, seq):
+        return f"{self.epoch}.{seq}"
+
+    def _resume_point(self, last_event_id):
+        """Vrátí (seq, události k přehrání). Neznámé nebo vypadlé id -> poslední stav."""
+        epoch, _, seq = (last_event_id or '').partition('.')
+        if epoch == self.epoch and seq.isdigit():
+            seq = int(seq)
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            if oldest <= seq + 1 and seq <= self._seq:
+                return seq, [e for e in self._events if e[0] > seq]
+        return self._seq, sorted(self._latest.values())
+
+    def stream(self, last_event_id=None):
+        """Generátor událostí pro jednoho klienta; None = keepalive."""
+        with self._cond:
+            self.subscribers += 1
+            cursor, pending = self._resume_point(last_event_id)
+        try:
+            while True:
+                for event in pending:
+                    cursor = event[0]
+                    yield event
+                with self._cond:
+                    if self._seq == cursor:
+                        self._cond.wait(EVENT_KEEPALIVE)
+                    if self._events and self._events[0][0] > cursor + 1:
+                        # Klient nestíhal a část událostí vypadla z bufferu
+                        cursor, pending = self._resume_point(None)
+                    else:
+                        pending = [e for e in self._events if e[0] > cursor]
+                if not pending:
+                    yield None
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    def stats(self):
+        with self._cond:
+            return {'subscribers': self.subscribers, 'last_id': self.event_id(self._seq),
+                    'buffered': len(self._events)}
+
+EVENT_HUB = EventHub(EVENT_BUFFER_SIZE)
+
+# --- LOG BUFFER ---
+# Řádky logu serveru čte jeden trvalý tail (LogFollower) a drží je v omezeném bufferu
+# s rostoucími čísly. Klienti si přes /api/logs?since=<seq> nebo SSE berou jen nové řádky.
+LOG_BUFFER_LINES = int(os.environ.get('LOG_BUFFER_LINES', 2000))
+LOG_TAIL_LINES = 100    # kolik řádků ukazuje konzole a /api/logs bez since
+LOG_SINCE_MAX = 1000    # strop řádků v jedné odpovědi na since
+
+class LogBuffer:
+    def __init__(self, size):
+        self.epoch = format(int(time.time()), 'x')  # seq po restartu panelu začíná znovu
+        self._lock = threading.Lock()
+        self._lines = collections.deque(maxlen=size)
+        self._seq = 0
+
+    def extend(self, lines):
+        """Přidá řádky a vrátí seq posledního z nich."""
+        with self._lock:
+            for line in lines:
+                self._seq += 1
+                self._lines.append((self._seq, line))
+            return self._seq
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def since(self, seq, limit=LOG_SINCE_MAX):
+        """Řádky novější než seq, nejvýš limit nejnovějších. Vrací (řádky, poslední seq, truncated);
+        truncated = část řádků za seq klient nedostane (vypadly z bufferu nebo přesáhly limit)."""
+        with self._lock:
+            if seq > self._seq:
+                seq = 0  # seq z dřívějšího běhu panelu
+            oldest = self._lines[0][0] if self._lines else self._seq + 1
+            start = max(seq + 1, oldest, self._seq - limit + 1)
+            lines = [line for _, line in itertools.islice(self._lines, start - oldest, None)]
+            return lines, self._seq, seq > 0 and start > seq + 1
+
+    def tail(self, count=LOG_TAIL_LINES):
+        with self._lock:
+            return [line for _, line in itertools.islice(self._lines, max(0, len(self._lines) - count), None)]
+
+    def stats(self):
+        with self._lock:
+            return {'epoch': self.epoch, 'seq': self._seq, 'buffered': len(self._lines)}
+
+LOG_BUFFER = LogBuffer(LOG_BUFFER_LINES)
+if MOCK_MODE:
+    LOG_BUFFER.extend(["Mock log entry 1", "Mock log entry 2", "[16:30:23 INFO]: Done!"])
+
+def publish_log_lines(lines):
+    """Zapsané řádky logu -> buffer + SSE událost 'log' (se seq pro navázání přes since)."""
+    if not lines: return
+    seq = LOG_BUFFER.extend(lines)
+    EVENT_HUB.publish('log', {'lines': lines, 'seq': seq, 'epoch': LOG_BUFFER.epoch})
+
+# --- PLAYER PAGINATION ---
+# Seznam hráčů i historie se čtou po stránkách (keyset), ne celá tabulka players.
+# Kurzor nese klíče posledního řádku; další stránka začíná hned za ním bez OFFSET.
+PLAYER_PAGE_SIZE = int(os.environ.get('PLAYER_PAGE_SIZE', 50))
+PLAYER_PAGE_MAX = 200
+PLAYER_SORTS = {
+    'last_seen': 'last_seen_ts',
+    'first_seen': 'first_seen_ts',
+    'name': 'name',
+}
+PLAYER_FILTERS = ('group', 'status', 'q', 'seen_from', 'seen_to', 'sort', 'dir', 'limit')
+UNGROUPED = 'Nezařazeno'
+
+def _encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _decode_cursor(token, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Neplatný kurzor")
+    return values
+
+def _day_to_ts(value, end=False):
+    """'YYYY-MM-DD' v lokálním čase -> epoch začátku (nebo konce) dne."""
+    ts = int(time.mktime(datetime.strptime(value, '%Y-%m-%d').timetuple()))
+    return ts + 86399 if end else ts
+
+def parse_player_page_args(args):
+    """Zvaliduje filtry, řazení a kurzor z query stringu. Chybu hlásí jako ValueError."""
+    sort = args.get('sort') or 'last_seen'
+    if sort not in PLAYER_SORTS:
+        raise ValueError(f"Neznámé řazení, povolené: {', '.join(PLAYER_SORTS)}")
+    direction = args.get('dir') or ('asc' if sort == 'name' else 'desc')
+    if direction not in ('asc', 'desc'):
+        raise ValueError("dir musí být asc nebo desc")
+    status = args.get('status') or 'all'
+    if status not in ('all', 'online', 'offline'):
+        raise ValueError("status musí být all, online nebo offline")
+    params = {
+        'group': args.get('group') or 'all',
+        'status': status,
+        'q': (args.get('q') or '').strip(),
+        'seen_from': args.get('seen_from') or '',
+        'seen_to': args.get('seen_to') or '',
+        'sort': sort,
+        'dir': direction,
+    }
+    try:
+        params['limit'] = min(max(int(args.get('limit') or PLAYER_PAGE_SIZE), 1), PLAYER_PAGE_MAX)
+        params['from_ts'] = _day_to_ts(params['seen_from']) if params['seen_from'] else None
+        params['to_ts'] = _day_to_ts(params['seen_to'], end=True) if params['seen_to'] else None
+    except ValueError:
+        raise ValueError("limit musí být číslo, seen_from/seen_to ve formátu YYYY-MM-DD")
+    token = args.get('cursor')
+    params['cursor'] = _decode_cursor(token, 2 if sort == 'name' else 3) if token else None
+    return params
+
+def fetch_player_page(db, select_sql, params):
+    """Načte jednu stránku hráčů. select_sql vybírá z `players p` (může obsahovat JOIN)
+    a musí vracet sloupce is_online, name a sloupec řazení. Vrací (řádky, kurzor další stránky)."""
+    where, args = [], []
+    group = params['group']
+    if group == UNGROUPED:
+        where.append("(p.group_name IS NULL OR p.group_name IN ('', ?))")
+        args.append(UNGROUPED)
+    elif group != 'all':
+        where.append("p.group_name = ?")
+        args.append(group)
+    if params['status'] != 'all':
+        where.append("p.is_online = ?")
+        args.append(1 if params['status'] == 'online' else 0)
+    if params['q']:
+        prefix = params['q'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        where.append("p.name LIKE ? ESCAPE '\\'")
+        args.append(prefix + '%')
+    if params['from_ts'] is not None:
+        where.append("p.last_seen_ts >= ?")
+        args.append(params['from_ts'])
+    if params['to_ts'] is not None:
+        where.append("p.last_seen_ts <= ?")
+        args.append(params['to_ts'])
+
+    # Online hráči vždy první, pak zvolené řazení a jméno jako jednoznačný klíč
+    sort_col = PLAYER_SORTS[params['sort']]
+    direction = params['dir'].upper()
+    op = '<' if direction == 'DESC' else '>'
+    keys = [('is_online', 'DESC', '<'), (sort_col, direction, op)]
+    if sort_col != 'name':
+        keys.append(('name', direction, op))
+
+    if params['cursor']:
+        ors = []
+        for i, (col, _, key_op) in enumerate(keys):
+            cond = [f"p.{c} = ?" for c, _, _ in keys[:i]] + [f"p.{col} {key_op} ?"]
+            ors.append('(' + ' AND '.join(cond) + ')')
+            args.extend(params['cursor'][:i + 1])
+        where.append('(' + ' OR '.join(ors) + ')')
+
+    sql = select_sql
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY ' + ', '.join(f"p.{col} {d}" for col, d, _ in keys) + ' LIMIT ?'
+    rows = db.execute(sql, args + [params['limit'] + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > params['limit']:
+        rows = rows[:params['limit']]
+        next_cursor = _encode_cursor([rows[-1][col] for col, _, _ in keys])
+    return rows, next_cursor
+
+def player_page_url(endpoint, params, cursor):
+    """URL další stránky se stejnými filtry (pro infinite scroll)."""
+    query = {k: params[k] for k in PLAYER_FILTERS if params.get(k) not in (None, '')}
+    return url_for(endpoint, cursor=cursor, **query)
+
+# Otevřená session online hráčů se připojí jedním dotazem (partial index idx_attendance_open_ts)
+# a živý čas (celkový + běžící session) se dopočítá rovnou v SQL
+PLAYER_CARD_SQL = '''
+    SELECT p.name, p.group_name, p.is_online, p.last_seen, p.last_seen_ts, p.first_seen_ts,
+           COALESCE(p.total_playtime, 0)
+             + COALESCE(CAST(strftime('%s', 'now') AS INTEGER) - s.login_ts, 0) AS playtime
+    FROM players p
+    LEFT JOIN (
+        SELECT player_name, MAX(login_ts) AS login_ts
+        FROM attendance WHERE logout_ts IS NULL
+        GROUP BY player_name
+    ) s ON s.player_name = p.name AND p.is_online = 1
+'''
+
+def player_card_data(row):
+    playtime = row['playtime']
+    return {
+        'name': row['name'],
+        'avatar_url': f"https://cravatar.eu/helmavatar/{row['name']}/64.png",
+        'group': row['group_name'] if row['group_name'] else UNGROUPED,
+        'is_online': bool(row['is_online']),
+        'last_seen': row['last_seen'],
+        'playtime_raw': playtime,
+        'playtime_formatted': format_playtime(playtime)
+    }
+
+def render_player_cards(db, names):
+    """{jméno: HTML karty} pro vybrané hráče (SSE událost 'players')."""
+    if not names: return {}
+    rows = db.execute(PLAYER_CARD_SQL + f" WHERE p.name IN ({','.join('?' * len(names))})", names).fetchall()
+    return {row['name']: render_template('partials/player_cards.html', players=[player_card_data(row)])
+            for row in rows}
+
 @app.route('/players/list')
 @login_required
 def players_list():
-    """Vrátí fragment a zároveň provede synchronizaci DB."""
-    response = get_rcon_response("list")
+    """Vrátí fragment se stránkou hráčů; první stránka zároveň provede synchronizaci DB."""
+    try:
+        params = parse_player_page_args(request.args)
+    except ValueError as e:
+        return f"Error: {e}", 400
+
     online_names = []
-    if response:
-        online_names = parse_players(response)
-    
-    # Sync to DB (zajistí, že online hráči jsou v DB a mají is_online=1, ostatní 0)
-    sync_players_to_db(online_names)
+    if not params['cursor']:
+        response = get_rcon_response("list")
+        parsed = parse_players(response) if response else []
+        if parsed is not None:
+            online_names = parsed
+            # Sync to DB (zajistí, že online hráči jsou v DB a mají is_online=1, ostatní 0)
+            sync_players_to_db(online_names)
+        else:
+            # Neznámý formát `list`: stav v DB se nemění, platí poslední známý
+            online_names = [row['name'] for row in get_db().execute('SELECT name FROM players WHERE is_online = 1')]
     
-    # Načíst VŠECHNY hráče z DB (historie)
     db = get_db()
-    players_data = [] 
-    
-    # Seřadit: Online první, pak podle posledního vidění
-    all_players_rows = db.execute("SELECT name, group_name, is_online, last_seen, total_playtime FROM players ORDER BY is_online DESC, last_seen DESC").fetchall()
-    
-    for row in all_players_rows:
-        is_online = bool(row['is_online'])
-        playtime = row['total_playtime'] or 0
+    # Živý odehraný čas se na kartách mění po minutách -> minuta je součástí verze;
+    # player_list.html vykresluje akce podle aktivních modulů -> i jejich verze
+    version, _ = content_version(db, 'players', 'attendance', 'modules')
+    token = f"{version}.{int(time.time()) // 60}"
+    cached = not_modified(token)
+    if cached:
+        if not params['cursor']:
+            cached.headers['X-Online-Players'] = ",".join(online_names)
+        return cached
+
+    rows, next_cursor = fetch_player_page(db, PLAYER_CARD_SQL, params)
+    players_data = [player_card_data(row) for row in rows]
+
+    next_url = player_page_url('players_list', params, next_cursor) if next_cursor else None
+    if params['cursor']:
+        # Další stránka: jen karty a nový sentinel, bez gridu a hlavičky
+        return with_validators(make_response(
+            render_template('partials/player_cards.html', players=players_data, next_url=next_url)), token)
         
-        # Live calculation: Pokud je online, přičíst čas od posledního přihlášení
-        if is_online:
-            active_session = db.execute('SELECT login_time FROM attendance WHERE player_name = ? AND logout_time IS NULL ORDER BY login_time DESC LIMIT 1', (row['name'],)).fetchone()
-            if active_session:
-                try:
-                    login_dt = datetime.strptime(active_session['login_time'], '%Y-%m-%d %H:%M:%S')
-                    duration = int((datetime.now() - login_dt).total_seconds())
-                    playtime += duration
-                except: pass
+    # Načíst aktivní moduly
+    cursor = db.cursor()
+    cursor.execute("SELECT id FROM modules WHERE enabled = 1")
+    active_mods = [r['id'] for r in cursor.fetchall()]
+
+    # Přidat hlavičku se seznamem online hráčů pro našeptávač (Versio 6.3)
+    resp = make_response(render_template('partials/player_list.html', players=players_data,
+                                          active_modules=active_mods, next_url=next_url))
+    resp.headers['X-Online-Players'] = ",".join(online_names)
+    return with_validators(resp, token)
+
+# --- STATS SAMPLER ---
+# Jedno vlákno na pozadí vzorkuje HW, TPS a online hráče; /api/stats jen vrací snapshot.
+# Počet otevřených dashboardů tak už nezvyšuje počet SSH/RCON dotazů.
+STATS_SAMPLE_INTERVAL = float(os.environ.get('STATS_SAMPLE_INTERVAL', 5))
+STATS_STALE_AFTER = float(os.environ.get('STATS_STALE_AFTER', STATS_SAMPLE_INTERVAL * 3))
+
+class StatsSampler:
+    def __init__(self, interval, stale_after):
+        self.interval = interval
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._wake = threading.Event()
+        self._snapshot = None
+        self._sampled_at = 0
+        self._thread = None
+
+    def sample(self):
+        hw = get_hw_stats()
+        tps_resp = get_rcon_response("tps")
+        
+        # Vyčištění TPS od barevných kódů a zkrácení
+        clean_tps = clean_mc_string(tps_resp)
+        tps = clean_tps if clean_tps and "Error" not in clean_tps else "N/A"
+        
+        # Online Players Info
+        list_resp = get_rcon_response("list")
+        players = []
+        players_ok = False  # False = počet hráčů neznámý (RCON nedostupný / neznámý formát)
+        # Only parse players if response is valid (doesn't contain "Error")
+        if list_resp and not list_resp.startswith("Error"):
+            players = parse_players(list_resp)
+            if players is None:
+                # Neznámý formát: ponechat poslední známý seznam, DB nesynchronizovat
+                with self._lock:
+                    players = (self._snapshot or {}).get('players', [])
+            else:
+                players_ok = True
+                # Změny online hráčů jdou do DB (a jako join/leave události) i bez otevřeného seznamu hráčů
+                sync_players_to_db(players)
+        return {'hw': hw, 'tps': tps, 'players': players, 'players_ok': players_ok}
+
+    def refresh(self, wait=False):
+        """Provede jeden vzorek. Pokud už vzorkuje jiné vlákno, nečeká (nebo s wait=True počká na něj)."""
+        if not self._refreshing.acquire(blocking=wait):
+            return
+        try:
+            if wait and self._snapshot is not None:
+                return  # mezitím vzorkoval někdo jiný
+            with app.app_context():
+                data = self.sample()
+            now = time.time()
+            with self._lock:
+                self._snapshot = data
+                self._sampled_at = now
+            try:
+                METRICS_STORE.record_snapshot(data, now)
+            except Exception as e:
+                print(f"[METRICS-ERROR] {e}")
+            try:
+                EVENT_HUB.publish('stats', stats_payload(data, now, get_thread_db()))
+            except Exception as e:
+                print(f"[EVENTS-ERROR] {e}")
+        finally:
+            self._refreshing.release()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[STATS-ERROR] {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def get(self):
+        """Vrátí (snapshot, sampled_at). Starý snapshot se vrátí hned a obnova se spustí na pozadí.
+        Snapshot je None, dokud se nepovede první vzorek."""
+        with self._lock:
+            snapshot, sampled_at = self._snapshot, self._sampled_at
+        if snapshot is None:
+            # Úplně první request po startu - počkáme na první vzorek
+            try:
+                self.refresh(wait=True)
+            except Exception as e:
+                print(f"[STATS-ERROR] {e}")
+            with self._lock:
+                snapshot, sampled_at = self._snapshot, self._sampled_at
+        elif time.time() - sampled_at > self.stale_after:
+            self._wake.set()
+        return snapshot, sampled_at
+
+# --- METRICS HISTORY ---
+# Time-series nad stejnou SQLite DB: posledních N vzorků v plném rozlišení drží
+# ring buffer v paměti, starší data jsou jen v agregovaných rollupech (1 min, 15 min, 1 h).
+METRICS = ('cpu_pct', 'ram_pct', 'tps', 'players')
+METRICS_RING_SIZE = int(os.environ.get('METRICS_RING_SIZE', 720))  # 1 h při vzorku à 5 s
+METRICS_ROLLUPS = {  # krok v sekundách -> retence v sekundách
+    60: 7 * 86400,
+    900: 90 * 86400,
+    3600: 730 * 86400,
+}
+METRICS_MAX_POINTS = 1000
+
+def _parse_tps_value(tps):
+    """Z 'TPS from last 1m, 5m, 15m: *20.0, 19.9, 19.9' vytáhne první hodnotu (1m)."""
+    if not tps or tps == "N/A": return None
+    m = re.search(r'(\d+(?:\.\d+)?)', tps.split(':', 1)[-1])
+    return float(m.group(1)) if m else None
+
+class MetricsStore:
+    def __init__(self, ring_size, rollups):
+        self.rollups = rollups
+        self._lock = threading.Lock()
+        self._ring = {m: collections.deque(maxlen=ring_size) for m in METRICS}
+        self._last_prune = 0
 
-        players_data.append({
-            'name': row['name'],
-            'avatar_url': f"https://cravatar.eu/helmavatar/{row['name']}/64.png",
-            'group': row['group_name'] if row['group_name'] else 'Nezařazeno',
-            'is_online': is_online,
-            'last_seen': row['last_seen'],
-            'playtime_raw': playtime,
-            'playtime_formatted': format_playtime(playtime)
+    def record(self, ts, values):
+        """Zapíše jeden vzorek {metric: value} do ring bufferu a všech rollupů (jedna transakce).
+        None = hodnota neznámá: v ring bufferu zůstane jako mezera (null), do rollupů se nepočítá."""
+        values = {m: v for m, v in values.items() if m in self._ring}
+        with self._lock:
+            for m, v in values.items():
+                self._ring[m].append((ts, v))
+        values = {m: v for m, v in values.items() if v is not None}
+        if not values: return
+
+        rows = [(m, step, int(ts // step) * step, v, v, v)
+                for m, v in values.items() for step in self.rollups]
+        db = get_thread_db()
+        with db:
+            db.executemany('''
+                INSERT INTO metric_rollups (metric, step, bucket, count, sum, min, max)
+                VALUES (?, ?, ?, 1, ?, ?, ?)
+                ON CONFLICT(metric, step, bucket) DO UPDATE SET
+                    count = count + 1,
+                    sum = sum + excluded.sum,
+                    min = MIN(min, excluded.min),
+                    max = MAX(max, excluded.max)
+            ''', rows)
+            if ts - self._last_prune > 3600:
+                self._prune(db, ts)
+
+    def record_snapshot(self, snapshot, ts):
+        hw = snapshot.get('hw', {})
+        probed = hw.get('probed', True)
+        self.record(ts, {
+            'cpu_pct': hw.get('cpu_pct') if probed and not hw.get('cpu_unknown') else None,
+            'ram_pct': hw.get('ram_pct') if probed and hw.get('ram_detail', 'N/A') != 'N/A' else None,
+            'tps': _parse_tps_value(snapshot.get('tps')),
+            'players': len(snapshot.get('players', [])) if snapshot.get('players_ok', True) else None,
         })
-        
-    # Načíst aktivní moduly
-    cursor = db.cursor()
-    cursor.execute("SELECT id FROM modules WHERE enabled = 1")
-    active_mods = [r['id'] for r in cursor.fetchall()]
 
-    # Přidat hlavičku se seznamem online hráčů pro našeptávač (Versio 6.3)
-    resp = make_response(render_template('partials/player_list.html', players=players_data, active_modules=active_mods))
-    resp.headers['X-Online-Players'] = ",".join(online_names)
-    return resp
+    def _prune(self, db, now):
+        for step, retention in self.rollups.items():
+            db.execute('DELETE FROM metric_rollups WHERE step = ? AND bucket < ?', (step, int(now - retention)))
+        self._last_prune = now
+
+    def _pick_step(self, start, end, step):
+        """Nejhrubší rollup, který je ještě <= požadovanému kroku (a nepřekročí METRICS_MAX_POINTS)."""
+        steps = sorted(self.rollups)
+        min_step = (end - start) / METRICS_MAX_POINTS
+        wanted = max(step or 0, min_step)
+        chosen = steps[0]
+        for s in steps:
+            if s <= wanted: chosen = s
+        # Nejmenší rollup, který ještě drží data pro začátek rozsahu
+        while chosen != steps[-1] and start < time.time() - self.rollups[chosen]:
+            chosen = steps[steps.index(chosen) + 1]
+        return chosen
+
+    def query(self, db, metric, start, end, step=None):
+        with self._lock:
+            ring = list(self._ring[metric])
+        # Surová data jen pokud je klient chce a celý rozsah je ještě v ring bufferu
+        if step is not None and step < min(self.rollups) and ring and ring[0][0] <= start:
+            points = [[int(ts), v, v, v] for ts, v in ring if start <= ts <= end]
+            return int(STATS_SAMPLE_INTERVAL), points
+
+        chosen = self._pick_step(start, end, step)
+        rows = db.execute('''
+            SELECT bucket, sum / count AS avg, min, max FROM metric_rollups
+            WHERE metric = ? AND step = ? AND bucket BETWEEN ? AND ?
+            ORDER BY bucket
+        ''', (metric, chosen, int(start // chosen) * chosen, int(end))).fetchall()
+        return chosen, [[r['bucket'], round(r['avg'], 2), r['min'], r['max']] for r in rows]
+
+METRICS_STORE = MetricsStore(METRICS_RING_SIZE, METRICS_ROLLUPS)
 
+@app.route('/api/stats/history')
 @login_required
-@app.route('/api/stats')
-def api_stats():
-    hw = get_hw_stats()
-    tps_resp = get_rcon_response("tps")
-    
-    # Vyčištění TPS od barevných kódů a zkrácení
-    clean_tps = clean_mc_string(tps_resp)
-    tps = clean_tps if clean_tps and "Error" not in clean_tps else "N/A"
-    
-    # Online Players Info
-    list_resp = get_rcon_response("list")
-    players = []
-    # Only parse players if response is valid (doesn't contain "Error")
-    if list_resp and not list_resp.startswith("Error"):
-        players = parse_players(list_resp)
+def api_stats_history():
+    """Historie metriky: ?metric=cpu_pct|ram_pct|tps|players&from=<epoch>&to=<epoch>&step=<s>"""
+    metric = request.args.get('metric', 'cpu_pct')
+    if metric not in METRICS:
+        return jsonify({"status": "error", "message": f"Neznámá metrika, povolené: {', '.join(METRICS)}"}), 400
+    try:
+        end = float(request.args.get('to') or time.time())
+        start = float(request.args.get('from') or end - 3600)
+        step = request.args.get('step')
+        step = int(step) if step else None
+        if not (math.isfinite(start) and math.isfinite(end)) or (step is not None and step <= 0):
+            raise ValueError
+    except ValueError:
+        return jsonify({"status": "error", "message": "from/to/step musí být konečná čísla (step kladný)"}), 400
+    if start >= end:
+        return jsonify({"status": "error", "message": "from musí být menší než to"}), 400
+
+    used_step, points = METRICS_STORE.query(get_db(), metric, start, end, step)
+    return jsonify({
+        "metric": metric,
+        "from": int(start),
+        "to": int(end),
+        "step": used_step,
+        "columns": ["ts", "avg", "min", "max"],
+        "points": points
+    })
+
+STATS_SAMPLER = StatsSampler(STATS_SAMPLE_INTERVAL, STATS_STALE_AFTER)
+
+def stats_payload(snapshot, sampled_at, db):
+    """JSON pro dashboard ze snapshotu sampleru (sdílí /api/stats i SSE událost 'stats')."""
+    hw = snapshot['hw']
+    tps = snapshot['tps']
+    players = snapshot['players']
+    age = round(time.time() - sampled_at, 1)
     
     # Prepare active modules list for frontend
-    db = get_db()
     cursor = db.cursor()
     cursor.execute("SELECT id FROM modules WHERE enabled = 1")
     active_mods = [r['id'] for r in cursor.fetchall()]
@@ -848,7 +2732,7 @@ def api_stats():
     mc_uptime_raw = hw.get('mc_uptime')
     is_up = mc_uptime_raw not in [None, 'N/A', 'Offline']
     
-    return jsonify({
+    return {
         'ram_pct': f"{hw['ram_pct']}%",
         'ram_detail': hw['ram_detail'],
         'ram_total_gb': hw.get('ram_total_gb', 0),
@@ -866,17 +2750,232 @@ def api_stats():
         'players_count': len(players),
         'players_list': players,
         'bluemap_url': BLUEMAP_URL,
-        'active_modules': active_mods
-    })
+        'active_modules': active_mods,
+        'sampled_at': datetime.fromtimestamp(sampled_at).strftime('%Y-%m-%d %H:%M:%S'),
+        'age_seconds': age,
+        'stale': age > STATS_SAMPLER.stale_after,
+        'rcon_breaker': RCON_BREAKER.snapshot()
+    }
+
+@login_required
+@app.route('/api/stats')
+def api_stats():
+    snapshot, sampled_at = STATS_SAMPLER.get()
+    if snapshot is None:
+        return jsonify({"status": "error", "message": "Statistiky zatím nejsou k dispozici"}), 503
+    return jsonify(stats_payload(snapshot, sampled_at, get_db()))
+
+if RUN_BACKGROUND_WORKERS:
+    STATS_SAMPLER.start()
+
+# --- LIVE WATCHER ---
+# Stav kontejneru a banlist hlídá jedno vlákno - jen dokud je připojený aspoň jeden
+# SSE klient - a do hubu publikuje pouze změny. Řádky logu posílá trvalý tail (LogFollower).
+LIVE_INTERVALS = {
+    'status': float(os.environ.get('LIVE_STATUS_INTERVAL', 3)),
+    'banlist': float(os.environ.get('LIVE_BANLIST_INTERVAL', 30)),
+}
+
+class LiveWatcher:
+    def __init__(self, hub, intervals):
+        self.hub = hub
+        self.intervals = intervals
+        self._due = {}
+        self._last = {}
+        self._wake = threading.Event()
+        self._thread = None
+
+    def poke(self, *tasks):
+        """Naplánuje okamžitou kontrolu (např. po banu nebo power akci)."""
+        for task in tasks:
+            self._due[task] = 0
+        self._wake.set()
+
+    def _publish_if_changed(self, kind, data):
+        if self._last.get(kind) != data:
+            self._last[kind] = data
+            self.hub.publish(kind, data)
+
+    def poll_status(self):
+        try:
+            status = fetch_server_status()
+        except Exception:
+            status = 'error'
+        self._publish_if_changed('status', {'status': status})
+
+    def poll_banlist(self):
+        token, names = fetch_banlist((self._last.get('banlist_token'),))
+        self._last['banlist_token'] = token
+        if names is not None:
+            self._publish_if_changed('banlist', {'names': names})
+
+    def _run(self):
+        while True:
+            self._wake.wait(1)
+            self._wake.clear()
+            if not self.hub.subscribers or MOCK_MODE:
+                continue  # nikdo se nedívá: nic nedotazujeme
+            now = time.time()
+            for task, interval in self.intervals.items():
+                if self._due.get(task, 0) > now: continue
+                self._due[task] = now + interval
+                try:
+                    with app.app_context():
+                        getattr(self, f'poll_{task}')()
+                except Exception as e:
+                    print(f"[LIVE-ERROR] {task}: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+LIVE_WATCHER = LiveWatcher(EVENT_HUB, LIVE_INTERVALS)
+if RUN_BACKGROUND_WORKERS:
+    LIVE_WATCHER.start()
+
+@app.route('/api/events')
+@login_required
+def event_stream():
+    """SSE stream událostí dashboardu (stats, players, log, banlist, status).
+    Po výpadku prohlížeč pošle Last-Event-ID a stream naváže tam, kde skončil."""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+
+    def generate():
+        yield "retry: 3000\n\n"
+        for event in EVENT_HUB.stream(last_event_id):
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            seq, kind, data = event
+            yield f"id: {EVENT_HUB.event_id(seq)}\nevent: {kind}\ndata: {json.dumps(data)}\n\n"
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/events/stats')
+@login_required
+def event_stream_stats():
+    return jsonify(dict(EVENT_HUB.stats(), log=dict(LOG_BUFFER.stats(), live=ATTENDANCE_TRACKER.follower.running)))
 
 # --- ATTENDANCE & MONITORING ---
 
+# Filtry docházky sdílí stránkované API i export
+ATTENDANCE_PAGE_MAX = 1000
+ATTENDANCE_EXPORT_COLUMNS = ('id', 'player_name', 'group_name', 'login_time', 'logout_time', 'duration', 'login_ts', 'logout_ts')
+ATTENDANCE_EXPORT_CHUNK = 1000
+
+def attendance_filters(args):
+    """WHERE část a parametry pro dotaz nad `attendance a JOIN players p`. Chybu hlásí ValueError.
+    Filtry: player (přesné jméno), group, from/to (YYYY-MM-DD podle začátku session), min_duration (s)."""
+    where, params = [], []
+    if args.get('player'):
+        where.append("a.player_name = ?")
+        params.append(args['player'])
+    group = args.get('group')
+    if group == UNGROUPED:
+        where.append("(p.group_name IS NULL OR p.group_name IN ('', ?))")
+        params.append(UNGROUPED)
+    elif group and group != 'all':
+        where.append("p.group_name = ?")
+        params.append(group)
+    try:
+        if args.get('from'):
+            where.append("a.login_ts >= ?")
+            params.append(_day_to_ts(args['from']))
+        if args.get('to'):
+            where.append("a.login_ts <= ?")
+            params.append(_day_to_ts(args['to'], end=True))
+    except ValueError:
+        raise ValueError("from/to musí být ve formátu YYYY-MM-DD")
+    if args.get('min_duration'):
+        try:
+            where.append("a.duration >= ?")
+            params.append(int(args['min_duration']))
+        except ValueError:
+            raise ValueError("min_duration musí být počet sekund")
+    return where, params
+
 @app.route('/api/attendance', methods=['GET'])
 @login_required
 def get_attendance():
-    db = get_db()
-    rows = db.execute('SELECT * FROM attendance ORDER BY login_time DESC LIMIT 100').fetchall()
-    return jsonify([dict(row) for row in rows])
+    """Session od nejnovějších, s filtry a keyset stránkováním (?cursor= z hlavičky X-Next-Cursor)."""
+    try:
+        where, params = attendance_filters(request.args)
+        limit = min(max(int(request.args.get('limit', 100)), 1), ATTENDANCE_PAGE_MAX)
+        cursor = _decode_cursor(request.args['cursor'], 2) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if cursor:
+        where.append("(a.login_ts < ? OR (a.login_ts = ? AND a.id < ?))")
+        params.extend([cursor[0], cursor[0], cursor[1]])
+
+    query = 'SELECT a.* FROM attendance a'
+    if request.args.get('group'):
+        query += ' LEFT JOIN players p ON p.name = a.player_name'
+    if where:
+        query += ' WHERE ' + ' AND '.join(where)
+    query += ' ORDER BY a.login_ts DESC, a.id DESC LIMIT ?'
+    rows = get_db().execute(query, params + [limit + 1]).fetchall()
+
+    resp = jsonify([dict(row) for row in rows[:limit]])
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = _encode_cursor([last['login_ts'], last['id']])
+        args = {k: v for k, v in request.args.items() if k != 'cursor'}
+        resp.headers['X-Next-Cursor'] = next_cursor
+        resp.headers['Link'] = f'<{url_for("get_attendance", cursor=next_cursor, **args)}>; rel="next"'
+    return resp
+
+@app.route('/api/attendance/export')
+@login_required
+def export_attendance():
+    """Streamuje session (chronologicky) jako CSV nebo NDJSON přímo z DB kurzoru.
+    Vlastní read-only spojení a dávky po ATTENDANCE_EXPORT_CHUNK řádcích -> konstantní paměť;
+    díky WAL export neblokuje zápisy trackeru ani ostatní requesty."""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"status": "error", "message": "format musí být csv nebo ndjson"}), 400
+    try:
+        where, params = attendance_filters(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    query = f"SELECT {', '.join('p.group_name' if c == 'group_name' else 'a.' + c for c in ATTENDANCE_EXPORT_COLUMNS)} " \
+            "FROM attendance a LEFT JOIN players p ON p.name = a.player_name"
+    if where:
+        query += ' WHERE ' + ' AND '.join(where)
+    query += ' ORDER BY a.login_ts, a.id'
+    db_path = DB_PATH
+
+    def generate():
+        db = _connect_db(db_path)
+        try:
+            cursor = db.execute(query, params)
+            out = io.StringIO()
+            writer = csv.writer(out)
+            if fmt == 'csv':
+                writer.writerow(ATTENDANCE_EXPORT_COLUMNS)
+            while True:
+                rows = cursor.fetchmany(ATTENDANCE_EXPORT_CHUNK)
+                if not rows: break
+                if fmt == 'csv':
+                    writer.writerows(rows)
+                else:
+                    for row in rows:
+                        out.write(json.dumps(dict(zip(ATTENDANCE_EXPORT_COLUMNS, row)), ensure_ascii=False))
+                        out.write('\n')
+                yield out.getvalue()
+                out.seek(0)
+                out.truncate()
+            if out.tell():
+                yield out.getvalue()
+        finally:
+            db.close()
+
+    filename = f"attendance_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{'csv' if fmt == 'csv' else 'ndjson'}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(generate(), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
 
 @login_required
 @app.route('/api/player/detail/<name>')
@@ -884,8 +2983,14 @@ def get_player_detail(name):
     """Vrátí kompletní historii a statistiky pro konkrétního hráče."""
     db = get_db()
     
-    # Základní info
-    player = db.execute('SELECT * FROM players WHERE name = ?', (name,)).fetchone()
+    # Základní info + živý čas (včetně otevřené session) v jednom dotazu
+    player = db.execute('''
+        SELECT p.*, COALESCE(p.total_playtime, 0) + CASE WHEN p.is_online THEN COALESCE((
+            SELECT CAST(strftime('%s', 'now') AS INTEGER) - MAX(login_ts) FROM attendance
+            WHERE player_name = p.name AND logout_ts IS NULL
+        ), 0) ELSE 0 END AS live_playtime
+        FROM players p WHERE p.name = ?
+    ''', (name,)).fetchone()
     if not player:
         return jsonify({"status": "error", "message": "Hráč nenalezen"}), 404
     
@@ -894,21 +2999,11 @@ def get_player_detail(name):
         SELECT login_time, logout_time, duration 
         FROM attendance 
         WHERE player_name = ? 
-        ORDER BY login_time DESC 
+        ORDER BY login_ts DESC 
         LIMIT 50
     ''', (name,)).fetchall()
     
-    # Live calculation pro detail
-    total_playtime = player['total_playtime'] or 0
-    is_online = bool(player['is_online'])
-    if is_online:
-        active_session = db.execute('SELECT login_time FROM attendance WHERE player_name = ? AND logout_time IS NULL ORDER BY login_time DESC LIMIT 1', (name,)).fetchone()
-        if active_session:
-            try:
-                login_dt = datetime.strptime(active_session['login_time'], '%Y-%m-%d %H:%M:%S')
-                duration = int((datetime.now() - login_dt).total_seconds())
-                total_playtime += duration
-            except: pass
+    total_playtime = player['live_playtime']
 
     return jsonify({
         "status": "success",
@@ -921,52 +3016,942 @@ def get_player_detail(name):
         "sessions": [dict(s) for s in sessions]
     })
 
-def background_attendance_tracker():
-    """Běží na pozadí a sleduje, kdo je online, pro účely docházky."""
-    while True:
+# --- ATTENDANCE ROLLUPS ---
+# attendance_daily: odehrané sekundy a počet session hráče za den (lokální datum).
+# attendance_hourly: hráčosekundy za hodinu (průměrný souběh = player_seconds / 3600) a špička.
+# Špička hodiny = max(počet online po každém joinu, carried = session běžící přes začátek hodiny);
+# souběh roste jen při joinu, takže je to přesné maximum. Zápis probíhá při uzavření session,
+# dotazy pak čtou jen řádky zvoleného rozsahu bez ohledu na délku historie.
+ROLLUP_MAX_DAYS = 366
+
+def _split_by_hour(start, end):
+    """[(začátek hodiny, sekundy)] pro interval rozdělený po celých hodinách."""
+    t = start
+    while t < end:
+        hour = t - t % 3600
+        nxt = min(end, hour + 3600)
+        yield hour, nxt - t
+        t = nxt
+
+def _split_by_day(start, end):
+    """[('YYYY-MM-DD', sekundy)] pro interval rozdělený po lokálních půlnocích."""
+    t = start
+    while t < end:
+        day = datetime.fromtimestamp(t).date()
+        midnight = int(datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp())
+        nxt = min(end, midnight)
+        yield day.isoformat(), nxt - t
+        t = nxt
+
+def _accumulate_session(daily, hourly, name, login_ts, logout_ts):
+    """Přičte jednu uzavřenou session do slovníků přírůstků (sdílí inkrementální zápis i rebuild)."""
+    login_day = datetime.fromtimestamp(login_ts).date().isoformat()
+    daily.setdefault((name, login_day), [0, 0])[1] += 1
+    for day, seconds in _split_by_day(login_ts, logout_ts):
+        daily.setdefault((name, day), [0, 0])[0] += seconds
+    login_hour = login_ts - login_ts % 3600
+    hourly.setdefault(login_hour, [0, 0, 0])[1] += 1
+    for hour, seconds in _split_by_hour(login_ts, logout_ts):
+        cell = hourly.setdefault(hour, [0, 0, 0])
+        cell[0] += seconds
+        if hour > login_hour:
+            cell[2] += 1  # session běžela už na začátku této hodiny
+
+def _write_rollups(db, daily, hourly):
+    db.executemany('''
+        INSERT INTO attendance_daily (player_name, day, seconds, sessions) VALUES (?, ?, ?, ?)
+        ON CONFLICT(player_name, day) DO UPDATE SET
+            seconds = seconds + excluded.seconds, sessions = sessions + excluded.sessions
+    ''', [(name, day, seconds, sessions) for (name, day), (seconds, sessions) in daily.items()])
+    db.executemany('''
+        INSERT INTO attendance_hourly (hour_ts, player_seconds, sessions, carried) VALUES (?, ?, ?, ?)
+        ON CONFLICT(hour_ts) DO UPDATE SET
+            player_seconds = player_seconds + excluded.player_seconds,
+            sessions = sessions + excluded.sessions,
+            carried = carried + excluded.carried
+    ''', [(hour, seconds, sessions, carried) for hour, (seconds, sessions, carried) in hourly.items()])
+
+def rollup_sessions(db, sessions):
+    """Započte uzavřené session [(jméno, login_ts, logout_ts)] do rollupů. Volat v transakci uzavření."""
+    daily, hourly = {}, {}
+    for name, login_ts, logout_ts in sessions:
+        _accumulate_session(daily, hourly, name, login_ts, logout_ts)
+    _write_rollups(db, daily, hourly)
+
+def record_concurrency_peak(db, ts):
+    """Po joinu zapíše aktuální počet online (otevřených session) jako kandidáta na špičku hodiny."""
+    online = db.execute('SELECT COUNT(*) FROM attendance WHERE logout_ts IS NULL').fetchone()[0]
+    db.execute('''
+        INSERT INTO attendance_hourly (hour_ts, peak) VALUES (?, ?)
+        ON CONFLICT(hour_ts) DO UPDATE SET peak = MAX(peak, excluded.peak)
+    ''', (ts - ts % 3600, online))
+
+def rebuild_attendance_rollups(db):
+    """Přepočítá rollupy z tabulky attendance (jeden průchod kurzorem). Volající řídí transakci."""
+    db.execute('DELETE FROM attendance_daily')
+    db.execute('DELETE FROM attendance_hourly')
+    daily, hourly = {}, {}
+    for row in db.execute('SELECT player_name, login_ts, logout_ts FROM attendance '
+                          'WHERE login_ts IS NOT NULL AND logout_ts IS NOT NULL'):
+        _accumulate_session(daily, hourly, row[0], row[1], max(row[1], row[2]))
+    _write_rollups(db, daily, hourly)
+    refresh_concurrency_peaks(db)
+    return len(daily), len(hourly)
+
+def refresh_concurrency_peaks(db, start_ts=0, end_ts=2**62):
+    """Špičky souběhu průchodem join/leave událostmi v čase (odchod před příchodem ve stejné
+    sekundě). S rozsahem přepočítá jen hodiny od start_ts do end_ts (doplněná historie)."""
+    start = start_ts - start_ts % 3600
+    online = db.execute('SELECT COUNT(*) FROM attendance WHERE login_ts < ? AND (logout_ts IS NULL OR logout_ts >= ?)',
+                        (start, start)).fetchone()[0]
+    peaks = {}
+    for ts, delta in db.execute('''
+        SELECT login_ts, 1 FROM attendance WHERE login_ts >= ? AND login_ts <= ?
+        UNION ALL
+        SELECT logout_ts, -1 FROM attendance WHERE logout_ts >= ? AND logout_ts <= ? AND login_ts IS NOT NULL
+        ORDER BY 1, 2
+    ''', (start, end_ts, start, end_ts)):
+        online += delta
+        if delta > 0:
+            hour = ts - ts % 3600
+            peaks[hour] = max(peaks.get(hour, 0), online)
+    db.executemany('''
+        INSERT INTO attendance_hourly (hour_ts, peak) VALUES (?, ?)
+        ON CONFLICT(hour_ts) DO UPDATE SET peak = MAX(peak, excluded.peak)
+    ''', peaks.items())
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Znovu spočítá attendance_daily/attendance_hourly z uložených session."""
+    db = get_thread_db()
+    migrate_db(db)
+    with db:
+        days, hours = rebuild_attendance_rollups(db)
+        bump_content_version(db, 'attendance')
+    print(f"Rollupy přepočítány: {days} hráčodnů, {hours} hodin.")
+
+def _rollup_range(args, default_days):
+    """from/to (YYYY-MM-DD, včetně) z query stringu; výchozí posledních default_days dní."""
+    today = datetime.now().date()
+    try:
+        to_day = datetime.strptime(args['to'], '%Y-%m-%d').date() if args.get('to') else today
+        from_day = (datetime.strptime(args['from'], '%Y-%m-%d').date() if args.get('from')
+                    else to_day - timedelta(days=default_days - 1))
+    except ValueError:
+        raise ValueError("from/to musí být ve formátu YYYY-MM-DD")
+    if from_day > to_day:
+        raise ValueError("from musí být nejpozději to")
+    if (to_day - from_day).days >= ROLLUP_MAX_DAYS:
+        raise ValueError(f"Rozsah může mít nejvýš {ROLLUP_MAX_DAYS} dní")
+    return from_day, to_day
+
+@app.route('/api/attendance/leaderboard')
+@login_required
+def attendance_leaderboard():
+    """Žebříček odehraného času za období (z attendance_daily), volitelně jen pro skupinu."""
+    try:
+        from_day, to_day = _rollup_range(request.args, 7)
+        limit = min(max(int(request.args.get('limit', 20)), 1), 500)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    group = request.args.get('group')
+    query = '''
+        SELECT d.player_name, p.group_name, SUM(d.seconds) AS seconds, SUM(d.sessions) AS sessions,
+               SUM(d.seconds > 0) AS days
+        FROM attendance_daily d LEFT JOIN players p ON p.name = d.player_name
+        WHERE d.day BETWEEN ? AND ?
+    '''
+    args = [from_day.isoformat(), to_day.isoformat()]
+    if group:
+        query += ' AND p.group_name = ?'
+        args.append(group)
+    query += ' GROUP BY d.player_name ORDER BY seconds DESC, d.player_name LIMIT ?'
+    rows = get_db().execute(query, args + [limit]).fetchall()
+    return jsonify({
+        "from": from_day.isoformat(),
+        "to": to_day.isoformat(),
+        "players": [{
+            "name": row['player_name'],
+            "group": row['group_name'] or UNGROUPED,
+            "seconds": row['seconds'],
+            "formatted": format_playtime(row['seconds']),
+            "sessions": row['sessions'],
+            "days": row['days'],
+        } for row in rows]
+    })
+
+@app.route('/api/attendance/heatmap')
+@login_required
+def attendance_heatmap():
+    """Souběh hráčů den v týdnu x hodina za období (z attendance_hourly).
+    avg = průměrný počet hráčů online v té hodině, peak = nejvyšší souběh."""
+    try:
+        from_day, to_day = _rollup_range(request.args, 28)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    start_ts = int(datetime.combine(from_day, datetime.min.time()).timestamp())
+    end_ts = int(datetime.combine(to_day + timedelta(days=1), datetime.min.time()).timestamp())
+    rows = get_db().execute('''
+        SELECT CAST(strftime('%w', hour_ts, 'unixepoch', 'localtime') AS INTEGER) AS weekday,
+               CAST(strftime('%H', hour_ts, 'unixepoch', 'localtime') AS INTEGER) AS hour,
+               SUM(player_seconds) AS player_seconds, MAX(MAX(peak, carried)) AS peak
+        FROM attendance_hourly WHERE hour_ts >= ? AND hour_ts < ?
+        GROUP BY weekday, hour
+    ''', (start_ts, end_ts)).fetchall()
+
+    # Kolikrát se každá (den v týdnu, hodina) v období vyskytla - jmenovatel průměru
+    occurrences = collections.Counter()
+    day = from_day
+    while day <= to_day:
+        occurrences[(day.isoweekday() % 7)] += 1
+        day += timedelta(days=1)
+    # Matice [den v týdnu 0=neděle .. 6=sobota][hodina 0..23] (stejně jako strftime('%w'))
+    avg = [[0.0] * 24 for _ in range(7)]
+    peak = [[0] * 24 for _ in range(7)]
+    for row in rows:
+        avg[row['weekday']][row['hour']] = round(row['player_seconds'] / (3600 * occurrences[row['weekday']]), 2)
+        peak[row['weekday']][row['hour']] = row['peak']
+    return jsonify({"from": from_day.isoformat(), "to": to_day.isoformat(), "avg": avg, "peak": peak})
+
+# --- LOG-DRIVEN ATTENDANCE ---
+# Session vznikají a končí podle řádků "joined/left the game" v logu serveru - s přesným časem.
+# Log se čte jedním trvalým `tail -f` přes SSH; offset je uložený v DB, takže po restartu panelu
+# se dočte, co mezitím přibylo. Dotaz `list` už jen občas srovná stav (zmeškané řádky, pád serveru).
+ATTENDANCE_RECONCILE_INTERVAL = int(os.environ.get('ATTENDANCE_RECONCILE_INTERVAL', 600))
+ATTENDANCE_POLL_INTERVAL = 60  # když log sledovat nejde (mock, bez SSH), jede jen `list` jako dřív
+LOG_ROTATE_CHECK_INTERVAL = 10
+LOG_BACKLOG_LINE_BYTES = 1024  # odhad délky řádku pro backlog: čte se jen posledních backlog*1 KiB před offsetem
+
+LOG_LINE_TIME_RE = re.compile(r'^\[(\d{1,2}):(\d{2}):(\d{2})')
+# Události píše jen Server thread ("[12:34:56] [Server thread/INFO]:", Paper "[12:34:56 INFO]:",
+# Forge s loggerem "[...] [minecraft/MinecraftServer]:"). Ukotvení a jméno bez znaků jako <>
+# zaručí, že chat ("<Bob> Alice left the game") se za událost nevydává.
+LOG_EVENT_PREFIX = r'^\[(\d{1,2}):(\d{2}):(\d{2})(?:\] \[Server thread/INFO\]| INFO\])(?: \[[^\]]*\])?: '
+LOG_JOIN_LEAVE_RE = re.compile(LOG_EVENT_PREFIX +
+                               r'([A-Za-z0-9_]{3,16})(?: \(formerly known as [A-Za-z0-9_]+\))? (joined|left) the game\s*$')
+LOG_SERVER_START_RE = re.compile(LOG_EVENT_PREFIX + r'Starting minecraft server version')
+
+def resolve_log_time(hour, minute, second, now_ts=None):
+    """Log nese jen čas. latest.log se rotuje o půlnoci a při startu, takže řádek patří
+    k nejbližšímu takovému času, který není v budoucnosti. Předpokládá stejné časové pásmo
+    panelu a serveru."""
+    now_ts = now_ts or time.time()
+    candidate = datetime.fromtimestamp(now_ts).replace(hour=hour, minute=minute, second=second, microsecond=0)
+    if candidate.timestamp() > now_ts + 60:
+        candidate -= timedelta(days=1)
+    return int(candidate.timestamp())
+
+def parse_attendance_line(line, now_ts=None, resolve_time=None):
+    """Řádek logu -> ('join'|'leave', jméno, ts), ('start', None, ts), nebo None.
+    resolve_time(h, m, s) určí datum jinak než podle aktuálního času (archivy)."""
+    event = LOG_JOIN_LEAVE_RE.match(line)
+    if event:
+        kind = 'join' if event.group(5) == 'joined' else 'leave'
+        name = event.group(4)
+    else:
+        event = LOG_SERVER_START_RE.match(line)
+        if not event: return None
+        kind, name = 'start', None
+    hms = int(event.group(1)), int(event.group(2)), int(event.group(3))
+    return kind, name, resolve_time(*hms) if resolve_time else resolve_log_time(*hms, now_ts)
+
+def open_session(db, name, ts):
+    """Otevře session, pokud hráč žádnou otevřenou nemá (duplicitní join se ignoruje)."""
+    if db.execute('SELECT 1 FROM attendance WHERE player_name = ? AND logout_ts IS NULL', (name,)).fetchone():
+        return False
+    login_time = datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+    db.execute('INSERT INTO attendance (player_name, login_time, login_ts) VALUES (?, ?, ?)', (name, login_time, ts))
+    record_concurrency_peak(db, ts)
+    return True
+
+def close_sessions(db, ts, names=None):
+    """Uzavře otevřené session (všech hráčů, nebo jen `names`) k času ts a přičte odehraný čas."""
+    query = 'SELECT id, player_name, login_ts FROM attendance WHERE logout_ts IS NULL'
+    args = ()
+    if names is not None:
+        names = list(names)
+        if not names: return 0
+        query += f" AND player_name IN ({','.join('?' * len(names))})"
+        args = names
+    rows = db.execute(query, args).fetchall()
+    if not rows: return 0
+    closed = [(row['id'], row['player_name'], max(0, ts - (row['login_ts'] or ts))) for row in rows]
+    rollup_sessions(db, [(row['player_name'], row['login_ts'] or ts, ts) for row in rows])
+    logout_time = datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+    db.executemany('UPDATE attendance SET logout_time = ?, logout_ts = ?, duration = ? WHERE id = ?',
+                   [(logout_time, ts, duration, sid) for sid, _, duration in closed])
+    # Přičíst čas k celkovému času hráče (Playtime Insights)
+    db.executemany('UPDATE players SET total_playtime = total_playtime + ? WHERE name = ?',
+                   [(duration, name) for _, name, duration in closed])
+    return len(closed)
+
+def apply_attendance_events(db, events):
+    """Zapíše join/leave/start události z logu. Volat uvnitř transakce."""
+    opened = closed = 0
+    for kind, name, ts in events:
+        if kind == 'join':
+            opened += open_session(db, name, ts)
+        elif kind == 'leave':
+            closed += close_sessions(db, ts, [name])
+        elif kind == 'start':
+            # Start serveru = nikdo nemůže být online; uzavře session po pádu bez "left the game"
+            closed += close_sessions(db, ts)
+    if opened or closed:
+        bump_content_version(db, 'attendance', *(['players'] if closed else []))
+
+def reconcile_attendance(db):
+    """Srovná otevřené session se skutečným `list` (zmeškané řádky logu, výpadek logu)."""
+    players_raw = get_rcon_response("list")
+    # Vyhneme se parsingu v mocku nebo při chybě
+    if not players_raw or players_raw.startswith("Error"):
+        return
+    online = parse_players(players_raw)
+    if online is None:
+        return  # neznámý formát - nelze rozlišit od prázdného serveru, session nechat být
+    online = set(online)
+    now_ts = int(time.time())
+    open_names = {row['player_name'] for row in
+                  db.execute('SELECT player_name FROM attendance WHERE logout_ts IS NULL').fetchall()}
+    logins = online - open_names
+    logouts = open_names - online
+    if not (logins or logouts):
+        return
+    # Všechny zápisy v jedné transakci (WAL -> čtenáři neblokují)
+    with db:
+        for name in logins:
+            open_session(db, name, now_ts)
+        close_sessions(db, now_ts, logouts)
+        bump_content_version(db, 'attendance', *(['players'] if logouts else []))
+
+class LogFollower:
+    """Trvalý `tail -f` logu přes SSH. Offset (inode + bajty) a čas posledního řádku drží tabulka
+    log_cursor; zpracované řádky a posun kurzoru se zapisují v jedné transakci.
+    Rotaci hlídá stat: starý soubor se dočte přes otevřený deskriptor a nový se čte od nuly,
+    takže se (na rozdíl od `tail -F`) neztratí řádky ani při restartu panelu."""
+    def __init__(self, name, on_lines, on_idle=None, on_committed=None, backlog=0):
+        self.name = name
+        self.on_lines = on_lines  # fn(db, lines, follower) - uvnitř transakce
+        self.on_idle = on_idle    # fn() - když tail nemá co poslat (dohnáno)
+        self.on_committed = on_committed  # fn(lines) - po commitu (buffer konzole, SSE)
+        self.backlog = backlog    # kolik řádků před startovní pozicí předat on_committed při prvním startu
+        self._backlog_sent = False
+        self.inode = None
+        self.offset = None
+        self.last_ts = None       # čas poslední zpracované události (diagnostika)
+        self.running = False
+
+    def path(self):
+        return os.environ.get('MC_LOG_PATH', '/home/minecraft/server/logs/latest.log')
+
+    def _stat(self):
+        client = get_ssh_client()
+        if not client: raise Exception("SSH connect failed")
+        with client:
+            stdin, stdout, stderr = client.exec_command(f"stat -c '%i %s' {shlex.quote(self.path())}")
+            parts = stdout.read().decode().split()
+        return (parts[0], int(parts[1])) if len(parts) == 2 else None
+
+    def _load_cursor(self, db):
+        return db.execute('SELECT path, inode, offset, last_ts FROM log_cursor WHERE name = ?', (self.name,)).fetchone()
+
+    def _save_cursor(self, db):
+        db.execute('''
+            INSERT INTO log_cursor (name, path, inode, offset, last_ts, updated_at) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET path = excluded.path, inode = excluded.inode, offset = excluded.offset,
+                last_ts = excluded.last_ts, updated_at = excluded.updated_at
+        ''', (self.name, self.path(), self.inode, self.offset, self.last_ts, int(time.time())))
+
+    def _start_position(self, db):
+        """Odkud číst: uložený offset, začátek nového souboru po rotaci, nebo konec (první start)."""
+        stat = self._stat()
+        if not stat: raise Exception(f"Log {self.path()} nenalezen")
+        inode, size = stat
+        cursor = self._load_cursor(db)
+        self.last_ts = cursor['last_ts'] if cursor else None
+        if cursor and cursor['path'] == self.path() and cursor['inode'] == inode and size >= cursor['offset']:
+            return inode, cursor['offset']
+        if cursor and cursor['path'] == self.path():
+            return inode, 0  # rotace nebo truncate, když panel neběžel
+        return inode, size
+
+    def _send_backlog(self, client):
+        """Jednorázově předá poslední řádky před startovní pozicí (konzole nezačíná prázdná)."""
+        self._backlog_sent = True
+        if not (self.on_committed and self.backlog and self.offset): return
+        start = max(0, self.offset - self.backlog * LOG_BACKLOG_LINE_BYTES)
+        stdin, stdout, stderr = client.exec_command(
+            f"tail -c +{start + 1} {shlex.quote(self.path())} | head -c {self.offset - start}")
+        lines = stdout.read().decode('utf8', errors='ignore').splitlines()
+        if start and lines: lines = lines[1:]  # první řádek okna bývá useknutý
+        self.on_committed(lines[-self.backlog:])
+
+    def _rotated(self):
+        stat = self._stat()
+        return stat is None or stat[0] != self.inode or stat[1] < self.offset
+
+    def run_once(self):
+        """Sleduje log, dokud nedojde k rotaci nebo chybě spojení."""
+        db = get_thread_db()
+        self.inode, self.offset = self._start_position(db)
+        client = get_ssh_client()
+        if not client: raise Exception("SSH connect failed")
+        if not self._backlog_sent:
+            self._send_backlog(client)
+        stdin, stdout, stderr = client.exec_command(f"tail -f -c +{self.offset + 1} {shlex.quote(self.path())}")
+        channel = stdout.channel
+        channel.settimeout(1.0)
+        buffer = b''
+        last_check = time.time()
+        self.running = True
         try:
-            with app.app_context():
-                players_raw = get_rcon_response("list")
-                # Vyhneme se parsingu v mocku nebo při chybě
-                if players_raw and not players_raw.startswith("Error"):
-                    online_names = parse_players(players_raw)
-                    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    db = sqlite3.connect(DB_PATH) # Přímé spojení ve vlákně
-                    db.row_factory = sqlite3.Row
-                    cursor = db.cursor()
-                    
-                    # 1. Kdopak se nám nově přihlásil?
-                    for name in online_names:
-                        active = cursor.execute('SELECT id FROM attendance WHERE player_name = ? AND logout_time IS NULL', (name,)).fetchone()
-                        if not active:
-                            cursor.execute('INSERT INTO attendance (player_name, login_time) VALUES (?, ?)', (name, now))
-                            db.commit()
-                    
-                    # 2. Kdopak se nám odhlásil?
-                    active_sessions = cursor.execute('SELECT id, player_name, login_time FROM attendance WHERE logout_time IS NULL').fetchall()
-                    for session in active_sessions:
-                        if session['player_name'] not in online_names:
-                            login_dt = datetime.strptime(session['login_time'], '%Y-%m-%d %H:%M:%S')
-                            logout_dt = datetime.now()
-                            duration = int((logout_dt - login_dt).total_seconds())
-                            
-                            cursor.execute('UPDATE attendance SET logout_time = ?, duration = ? WHERE id = ?', 
-                                       (now, duration, session['id']))
-                            
-                            # 3. Přičíst čas k celkovému času hráče (Playtime Insights)
-                            cursor.execute('UPDATE players SET total_playtime = total_playtime + ? WHERE name = ?',
-                                       (duration, session['player_name']))
-                            db.commit()
-                    db.close()
-                        
+            while True:
+                try:
+                    data = channel.recv(65536)
+                    if not data: raise Exception("tail skončil")
+                except socket.timeout:
+                    data = None
+                if data:
+                    buffer += data
+                    end = buffer.rfind(b'\n') + 1
+                    if end:
+                        lines = buffer[:end].decode('utf8', errors='ignore').splitlines()
+                        buffer = buffer[end:]
+                        with db:
+                            self.on_lines(db, lines, self)
+                            self.offset += end
+                            self._save_cursor(db)
+                        if self.on_committed: self.on_committed(lines)
+                    continue
+                # Nic nového: všechno dohnáno
+                if self.on_idle: self.on_idle()
+                if time.time() - last_check >= LOG_ROTATE_CHECK_INTERVAL:
+                    last_check = time.time()
+                    if self._rotated():
+                        return  # starý soubor je dočtený (tail -f drží deskriptor), začneme nový
+        finally:
+            self.running = False
+            channel.close()
+            client.close()
+
+def _attendance_lines(db, lines, follower):
+    events = [event for event in (parse_attendance_line(line) for line in lines) if event]
+    if events:
+        follower.last_ts = events[-1][2]
+        apply_attendance_events(db, events)
+
+def _server_log_lines(db, lines, follower):
+    _attendance_lines(db, lines, follower)
+    index_log_lines(db, lines, os.path.basename(follower.path()), resolve_log_time)
+
+class AttendanceTracker:
+    def __init__(self):
+        # Jediný tail logu serveru: docházka a fulltext v transakci, pak konzole (LOG_BUFFER + SSE)
+        self.follower = LogFollower('attendance', _server_log_lines, on_idle=self._maybe_reconcile,
+                                    on_committed=publish_log_lines, backlog=LOG_TAIL_LINES)
+        self._last_reconcile = 0
+
+    def _maybe_reconcile(self, interval=ATTENDANCE_RECONCILE_INTERVAL):
+        if time.time() - self._last_reconcile < interval: return
+        self._last_reconcile = time.time()
+        try:
+            reconcile_attendance(get_thread_db())
         except Exception as e:
             print(f"[ATTENDANCE-ERROR] {e}")
-            
-        time.sleep(60) # Kontrola každou minutu
+
+    def run(self):
+        """Běží na pozadí: sleduje log, a když to nejde, aspoň jednou za minutu porovná `list`."""
+        while True:
+            with app.app_context():
+                if not MOCK_MODE:
+                    try:
+                        self.follower.run_once()
+                        continue  # rotace logu - hned navázat na nový soubor
+                    except Exception as e:
+                        print(f"[ATTENDANCE-LOG] {e}")
+                self._maybe_reconcile(ATTENDANCE_POLL_INTERVAL)
+            time.sleep(ATTENDANCE_POLL_INTERVAL)
+
+ATTENDANCE_TRACKER = AttendanceTracker()
 
 # Spustit tracker v samostatném vlákně
-threading.Thread(target=background_attendance_tracker, daemon=True).start()
+if RUN_BACKGROUND_WORKERS:
+    threading.Thread(target=ATTENDANCE_TRACKER.run, daemon=True).start()
+
+# --- LOG SEARCH ---
+# Řádky logu se ukládají do log_lines + FTS5 (log_fts). latest.log se indexuje živě ze stejného
+# tailu jako docházka (ve stejné transakci jako posun kurzoru), archivy logs/*.log.gz zpracuje
+# LogIndexer na pozadí po dávkách - offset v log_files, takže po restartu naváže.
+LOG_INDEX_DAYS = int(os.environ.get('LOG_INDEX_DAYS', 180))  # starší archivy/řádky se neindexují
+LOG_INDEX_SCAN_INTERVAL = int(os.environ.get('LOG_INDEX_SCAN_INTERVAL', 900))
+LOG_INDEX_BATCH = 2000
+LOG_SEARCH_PAGE_MAX = 200
+# "[12:34:56] [Server thread/INFO]: zpráva", "[12:34:56 INFO]: zpráva", Forge "[...] [mod/Třída]: zpráva"
+LOG_LINE_RE = re.compile(r'^\[(\d{1,2}):(\d{2}):(\d{2})(?:\s+(\w+))?\]\s*(?:\[([^\]]+?)/(\w+)\])?(?:\s*\[[^\]]*\])*:\s?(.*)$')
+LOG_PLAYER_RE = re.compile(
+    r'^(?:(?:\[[^\]]*\] )?<([A-Za-z0-9_]{3,16})> '
+    r'|([A-Za-z0-9_]{3,16})(?:\[/[^\]]+\])? (?:joined the game|left the game|lost connection|issued server command'
+    r'|logged in with entity id|has made the advancement|has completed the challenge|has reached the goal)'
+    r'|UUID of player ([A-Za-z0-9_]{3,16}) is)')
+LOG_ARCHIVE_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})-(\d+)\.log\.gz$')  # den a pořadí v rámci dne
+
+def parse_log_line(line, resolve_time):
+    """Řádek logu -> (ts, level, vlákno, hráč, zpráva), nebo None (pokračování, např. stack trace)."""
+    m = LOG_LINE_RE.match(line)
+    if not m: return None
+    message = m.group(7)
+    who = LOG_PLAYER_RE.match(message)
+    ts = resolve_time(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+    return ts, m.group(6) or m.group(4), m.group(5), who.group(who.lastindex) if who else None, message
+
+def index_log_lines(db, lines, source, resolve_time):
+    """Vloží řádky do log_lines (v transakci volajícího). Pokračovací řádky dědí čas a level
+    předchozího. Opakovaný řádek ve stejné sekundě dostane pořadí výskytu v rámci zdroje, takže
+    se uloží každý; znovu načtený řádek (latest.log po rotaci v archivu) má stejný klíč a přeskočí se."""
+    rows, prev = [], None
+    for line in lines:
+        if not line.strip(): continue
+        parsed = parse_log_line(line, resolve_time)
+        if parsed:
+            prev = parsed
+        elif prev:
+            parsed = (prev[0], prev[1], prev[2], None, line)
+        else:
+            continue
+        digest = hashlib.blake2b(line.encode('utf8', errors='ignore'), digest_size=8).digest()
+        rows.append(parsed + (source, int.from_bytes(digest, 'big', signed=True)))
+    if not rows: return 0
+    # Výskyty z předchozích dávek téhož zdroje (dávka může skončit uprostřed sekundy)
+    seen = {(ts, line_hash): count for ts, line_hash, count in db.execute('''
+        SELECT ts, line_hash, COUNT(*) FROM log_lines WHERE source = ? AND ts BETWEEN ? AND ? GROUP BY ts, line_hash
+    ''', (source, min(r[0] for r in rows), max(r[0] for r in rows)))}
+    for i, row in enumerate(rows):
+        key = (row[0], row[6])
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        rows[i] = row + (occurrence,)
+    db.executemany('''
+        INSERT OR IGNORE INTO log_lines (ts, level, thread, player, message, source, line_hash, occurrence)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    return len(rows)
+
+class ArchiveClock:
+    """Čas řádků archivu: datum z názvu souboru; když čas klesne (půlnoc), posune se o den."""
+    def __init__(self, day, last_ts=None):
+        self.day = datetime.strptime(day, '%Y-%m-%d')
+        self.last = last_ts
+        self.shift = max(0, (datetime.fromtimestamp(last_ts) - self.day).days) if last_ts else 0
+
+    def __call__(self, hour, minute, second):
+        moment = self.day + timedelta(days=self.shift, hours=hour, minutes=minute, seconds=second)
+        ts = int(moment.timestamp())
+        if self.last and ts < self.last - 3600:
+            self.shift += 1
+            ts += 86400
+        self.last = ts
+        return ts
+
+class LogIndexer:
+    """Na pozadí zaindexuje archivy logů (nejnovější první). Každá dávka se zapisuje spolu
+    s offsetem v log_files, takže přerušená indexace pokračuje tam, kde skončila."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = {'archives': 0, 'done': 0, 'current': None, 'lines': 0, 'error': None, 'scanned_at': None}
+
+    def log_dir(self):
+        return os.path.dirname(os.environ.get('MC_LOG_PATH', '/home/minecraft/server/logs/latest.log'))
+
+    def _update(self, **changes):
+        with self._lock:
+            self.state.update(changes)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.state)
+
+    def list_archives(self, client):
+        """[(název, den, velikost)] archivů v okně LOG_INDEX_DAYS, od nejnovějšího."""
+        stdin, stdout, stderr = client.exec_command(
+            f"cd {shlex.quote(self.log_dir())} && stat -c '%n %s' -- *.log.gz 2>/dev/null")
+        cutoff = (datetime.now() - timedelta(days=LOG_INDEX_DAYS)).strftime('%Y-%m-%d')
+        archives = []
+        for line in stdout.read().decode('utf8', errors='ignore').splitlines():
+            name, _, size = line.rpartition(' ')
+            m = LOG_ARCHIVE_RE.match(name)
+            if m and size.isdigit() and m.group(1) >= cutoff:
+                archives.append((name, m.group(1), int(size)))
+        return sorted(archives, reverse=True)
+
+    def index_archive(self, client, db, name, day, size):
+        progress = db.execute('SELECT * FROM log_files WHERE path = ?', (name,)).fetchone()
+        if progress and progress['size'] == size and progress['done']:
+            return
+        # Změněná velikost = jiný soubor se stejným jménem -> od začátku
+        resume = progress if progress and progress['size'] == size else None
+        offset = resume['offset'] if resume else 0
+        total = resume['lines'] if resume else 0
+        clock = ArchiveClock(day, resume['last_ts'] if resume else None)
+        self._update(current=name)
+        stdin, stdout, stderr = client.exec_command(
+            f"gzip -dc {shlex.quote(os.path.join(self.log_dir(), name))} | tail -c +{offset + 1}")
+        channel = stdout.channel
+        channel.settimeout(60)
+        buffer, eof = b'', False
+        try:
+            while not eof:
+                data = channel.recv(65536)
+                eof = not data
+                buffer += data
+                end = len(buffer) if eof else buffer.rfind(b'\n') + 1
+                if not eof and (not end or buffer.count(b'\n', 0, end) < LOG_INDEX_BATCH):
+                    continue
+                lines = buffer[:end].decode('utf8', errors='ignore').splitlines()
+                buffer = buffer[end:]
+                with db:
+                    total += index_log_lines(db, lines, name, clock)
+                    offset += end
+                    db.execute('''
+                        INSERT INTO log_files (path, size, offset, last_ts, lines, done, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(path) DO UPDATE SET size = excluded.size, offset = excluded.offset, last_ts = excluded.last_ts,
+                            lines = excluded.lines, done = excluded.done, updated_at = excluded.updated_at
+                    ''', (name, size, offset, clock.last, total, 1 if eof else 0, int(time.time())))
+                with self._lock:
+                    self.state['lines'] += len(lines)
+                time.sleep(0.05)  # dávky s pauzou, ať zápisy trackeru nečekají na zámek
+        finally:
+            channel.close()
+
+    def prune(self, db):
+        cutoff = int((datetime.now() - timedelta(days=LOG_INDEX_DAYS)).timestamp())
+        with db:
+            db.execute('DELETE FROM log_lines WHERE ts < ?', (cutoff,))
+
+    def run_once(self):
+        db = get_thread_db()
+        client = get_ssh_client()
+        if not client: raise Exception("SSH connect failed")
+        with client:
+            archives = self.list_archives(client)
+            self._update(archives=len(archives), done=0, error=None, scanned_at=int(time.time()))
+            for done, (name, day, size) in enumerate(archives):
+                self._update(done=done)
+                self.index_archive(client, db, name, day, size)
+            self._update(done=len(archives), current=None)
+        self.prune(db)
+
+    def run(self):
+        while True:
+            if not MOCK_MODE:
+                try:
+                    with app.app_context():
+                        self.run_once()
+                except Exception as e:
+                    self._update(error=str(e), current=None)
+                    print(f"[LOG-INDEX] {e}")
+            time.sleep(LOG_INDEX_SCAN_INTERVAL)
+
+LOG_INDEXER = LogIndexer()
+if RUN_BACKGROUND_WORKERS:
+    threading.Thread(target=LOG_INDEXER.run, daemon=True).start()
+
+def _fts_query(text):
+    """Uživatelský text -> bezpečný FTS5 dotaz: každé slovo jako fráze, 'slo*' jako prefix."""
+    terms = []
+    for word in text.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+@app.route('/api/logs/search')
+@login_required
+def search_logs():
+    """Fulltext v zaindexovaných lozích, od nejnovějších. Filtry: q (slova, prefix*), player,
+    level, from/to (YYYY-MM-DD); stránkování ?cursor= z hlavičky X-Next-Cursor."""
+    where, params = [], []
+    query = 'SELECT l.id, l.ts, l.level, l.thread, l.player, l.source, l.message FROM log_lines l'
+    q = _fts_query(request.args.get('q', ''))
+    if q:
+        query += ' JOIN log_fts ON log_fts.rowid = l.id'
+        where.append('log_fts MATCH ?')
+        params.append(q)
+    if request.args.get('player'):
+        where.append('l.player = ?')
+        params.append(request.args['player'])
+    if request.args.get('level'):
+        where.append('l.level = ?')
+        params.append(request.args['level'].upper())
+    try:
+        if request.args.get('from'):
+            where.append('l.ts >= ?')
+            params.append(_day_to_ts(request.args['from']))
+        if request.args.get('to'):
+            where.append('l.ts <= ?')
+            params.append(_day_to_ts(request.args['to'], end=True))
+    except ValueError:
+        return jsonify({"status": "error", "message": "from/to musí být ve formátu YYYY-MM-DD"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), LOG_SEARCH_PAGE_MAX)
+        cursor = _decode_cursor(request.args['cursor'], 2) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if cursor:
+        where.append('(l.ts < ? OR (l.ts = ? AND l.id < ?))')
+        params.extend([cursor[0], cursor[0], cursor[1]])
+    if where:
+        query += ' WHERE ' + ' AND '.join(where)
+    query += ' ORDER BY l.ts DESC, l.id DESC LIMIT ?'
+    rows = get_db().execute(query, params + [limit + 1]).fetchall()
+
+    results = []
+    for row in rows[:limit]:
+        item = dict(row)
+        item['time'] = datetime.fromtimestamp(row['ts']).strftime('%Y-%m-%d %H:%M:%S')
+        results.append(item)
+    resp = jsonify(results)
+    if len(rows) > limit:
+        next_cursor = _encode_cursor([rows[limit - 1]['ts'], rows[limit - 1]['id']])
+        args = {k: v for k, v in request.args.items() if k != 'cursor'}
+        resp.headers['X-Next-Cursor'] = next_cursor
+        resp.headers['Link'] = f'<{url_for("search_logs", cursor=next_cursor, **args)}>; rel="next"'
+    return resp
+
+@app.route('/api/logs/index')
+@login_required
+def log_index_stats():
+    """Stav indexace archivů a velikost indexu."""
+    row = get_db().execute('SELECT COUNT(*) AS lines, MIN(ts) AS oldest, MAX(ts) AS newest FROM log_lines').fetchone()
+    return jsonify(dict(LOG_INDEXER.stats(), indexed=dict(row)))
+
+# --- ATTENDANCE BACKFILL ---
+# Docházka v DB začíná nasazením panelu; starší historii lze jednorázově doplnit z logs/*.log.gz.
+# Archivy se jednou stáhnou přes SFTP do DATA_DIR, rozbalí a projdou v process poolu (parsování je
+# CPU-bound) a výsledky se zapisují po souborech v chronologickém pořadí: session, rollupy, hráči
+# a záznam v attendance_backfill v jedné transakci. Přerušený běh tak pokračuje dalším archivem.
+BACKFILL_WORKERS = int(os.environ.get('BACKFILL_WORKERS', os.cpu_count() or 2))
+BACKFILL_CACHE_DIR = os.path.join(DATA_DIR, 'log_archive')
+
+def _archive_attendance_events(local_path, day):
+    """(Proces poolu) Rozbalí archiv a vrátí (události join/leave/start, čas posledního řádku)."""
+    clock = ArchiveClock(day)
+    events, last_line = [], None
+    with gzip.open(local_path, 'rt', encoding='utf8', errors='ignore') as f:
+        for line in f:
+            if line.startswith('['):
+                last_line = line
+            # Rychlé předfiltrování - regexy jen pro řádky, které mohou být událostí
+            if 'the game' in line or 'Starting minecraft server' in line:
+                event = parse_attendance_line(line, resolve_time=clock)
+                if event: events.append(event)
+    m = LOG_LINE_TIME_RE.match(last_line or '')
+    return events, clock(int(m.group(1)), int(m.group(2)), int(m.group(3))) if m else None
+
+def pair_backfill_sessions(events, carry, stop_ts=None):
+    """Spáruje join/leave do session [(jméno, login_ts, logout_ts)]. carry = {jméno: login_ts}
+    otevřené z předchozího archivu; start serveru je uzavře k poslednímu známému času běhu.
+    Vrací (session, otevřené na konci)."""
+    online, sessions = dict(carry), []
+    for kind, name, ts in events:
+        if kind == 'join':
+            online.setdefault(name, ts)
+        elif kind == 'leave':
+            if name in online:
+                sessions.append((name, online.pop(name), ts))
+        elif kind == 'start':
+            end = stop_ts if stop_ts is not None else ts
+            sessions.extend((player, login, max(login, end)) for player, login in online.items())
+            online.clear()
+        stop_ts = ts
+    return sessions, online
+
+def insert_backfill_sessions(db, sessions):
+    """Vloží session, které se nepřekrývají s žádnou session téhož hráče v DB, a započte je
+    do rollupů a hráčů (total_playtime, first_seen). Volat v transakci. Vrací vložené session."""
+    fresh = [s for s in sessions if not db.execute(
+        'SELECT 1 FROM attendance WHERE player_name = ? AND login_ts <= ? AND COALESCE(logout_ts, ?) >= ? LIMIT 1',
+        (s[0], s[2], s[2], s[1])).fetchone()]
+    if not fresh: return fresh
+    fmt = lambda ts: datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+    db.executemany('''
+        INSERT INTO attendance (player_name, login_time, login_ts, logout_time, logout_ts, duration)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(name, fmt(login), login, fmt(logout), logout, logout - login) for name, login, logout in fresh])
+    rollup_sessions(db, fresh)
+    players = {}
+    for name, login, logout in fresh:
+        first, last, total = players.get(name, (login, logout, 0))
+        players[name] = (min(first, login), max(last, logout), total + logout - login)
+    db.executemany('''
+        INSERT INTO players (name, first_seen, first_seen_ts, last_seen, last_seen_ts, total_playtime)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            total_playtime = total_playtime + excluded.total_playtime,
+            first_seen = CASE WHEN excluded.first_seen_ts < COALESCE(first_seen_ts, excluded.first_seen_ts + 1)
+                THEN excluded.first_seen ELSE first_seen END,
+            first_seen_ts = MIN(COALESCE(first_seen_ts, excluded.first_seen_ts), excluded.first_seen_ts),
+            last_seen = CASE WHEN excluded.last_seen_ts > COALESCE(last_seen_ts, 0) THEN excluded.last_seen ELSE last_seen END,
+            last_seen_ts = MAX(COALESCE(last_seen_ts, 0), excluded.last_seen_ts)
+    ''', [(name, fmt(first), first, fmt(last), last, total) for name, (first, last, total) in players.items()])
+    refresh_concurrency_peaks(db, min(s[1] for s in fresh), max(s[2] for s in fresh))
+    bump_content_version(db, 'attendance', 'players')
+    return fresh
+
+class AttendanceBackfill:
+    """Jednorázové doplnění docházky z archivů logů; průběh čte /api/attendance/backfill."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = threading.Lock()
+        self.state = {'running': False, 'archives': 0, 'pending': 0, 'fetched': 0, 'done': 0, 'current': None,
+                      'sessions': 0, 'duplicates': 0, 'error': None, 'started_at': None, 'finished_at': None}
+
+    def _update(self, **changes):
+        with self._lock:
+            self.state.update(changes)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.state)
+
+    def is_running(self):
+        return self._running.locked()
+
+    def list_archives(self, sftp, log_dir):
+        """[(název, den, velikost)] všech archivů od nejstaršího (pořadí v rámci dne podle čísla)."""
+        archives = []
+        for attr in sftp.listdir_attr(log_dir):
+            m = LOG_ARCHIVE_RE.match(attr.filename)
+            if m:
+                archives.append(((m.group(1), int(m.group(2))), attr.filename, m.group(1), attr.st_size))
+        return [(name, day, size) for _, name, day, size in sorted(archives)]
+
+    def _fetch(self, sftp, log_dir, name, size):
+        """Stáhne archiv do BACKFILL_CACHE_DIR (znovu jen při jiné velikosti)."""
+        local = os.path.join(BACKFILL_CACHE_DIR, name)
+        if not (os.path.exists(local) and os.path.getsize(local) == size):
+            sftp.get(f"{log_dir}/{name}", local + '.part')
+            os.replace(local + '.part', local)
+        return local
+
+    def run(self, workers=BACKFILL_WORKERS, progress=None):
+        """Stáhne a zpracuje archivy, které ještě nejsou v attendance_backfill. Vrací stav."""
+        if not self._running.acquire(blocking=False):
+            raise RuntimeError("Backfill už běží")
+        try:
+            self._update(running=True, fetched=0, done=0, current=None, sessions=0, duplicates=0,
+                         error=None, started_at=int(time.time()), finished_at=None)
+            self._run(workers, progress or (lambda message: None))
+        except Exception as e:
+            self._update(error=str(e))
+            raise
+        finally:
+            self._update(running=False, current=None, finished_at=int(time.time()))
+            self._running.release()
+        return self.stats()
+
+    def _run(self, workers, progress):
+        db = get_thread_db()
+        log_dir = LOG_INDEXER.log_dir()
+        finished = {row['path']: row for row in db.execute('SELECT * FROM attendance_backfill')}
+        client = get_ssh_client()
+        if not client: raise Exception("SSH connect failed")
+        with client:
+            sftp = client.open_sftp()
+            try:
+                archives = self.list_archives(sftp, log_dir)
+                pending = [a for a in archives if not (a[0] in finished and finished[a[0]]['size'] == a[2])]
+                self._update(archives=len(archives), pending=len(pending))
+                progress(f"Archivů: {len(archives)}, ke zpracování: {len(pending)}")
+                if not pending: return
+                os.makedirs(BACKFILL_CACHE_DIR, exist_ok=True)
+                # forkserver: workery vznikají z čistého procesu bez vláken, SSH spojení a zámků panelu
+                # (fork z tohoto procesu by mohl zdědit zamčený zámek); import app v nich nic nespouští
+                pool = concurrent.futures.ProcessPoolExecutor(max_workers=max(1, workers),
+                                                              mp_context=multiprocessing.get_context('forkserver'))
+                try:
+                    self._process_in_order(db, sftp, log_dir, pool, max(1, workers), archives, pending, finished, progress)
+                finally:
+                    pool.shutdown(cancel_futures=True)
+            finally:
+                sftp.close()
+
+    def _process_in_order(self, db, sftp, log_dir, pool, workers, archives, pending, finished, progress):
+        """Stahuje a parsuje s předstihem (okno o velikosti poolu), ale zapisuje chronologicky a každý
+        archiv hned po dokončení - přerušení tak přijde nejvýš o rozpracované archivy v okně.
+        Otevřené session přechází do dalšího archivu."""
+        to_fetch = iter(pending)
+        inflight = collections.deque()  # (název, lokální cesta, future) v chronologickém pořadí
+
+        def fill():
+            while len(inflight) <= workers:
+                archive = next(to_fetch, None)
+                if archive is None: return
+                name, day, size = archive
+                local = self._fetch(sftp, log_dir, name, size)
+                inflight.append((name, local, pool.submit(_archive_attendance_events, local, day)))
+                with self._lock:
+                    self.state['fetched'] += 1
+
+        carry, stop_ts, done = {}, None, 0
+        for name, day, size in archives:
+            if name in finished and finished[name]['size'] == size:
+                row = finished[name]
+                carry, stop_ts = json.loads(row['carry']), row['last_ts']
+                continue
+            fill()  # stáhnout další archivy, zatímco pool parsuje
+            _, local, future = inflight.popleft()
+            self._update(current=name)
+            try:
+                events, last_ts = future.result()
+            except Exception as e:
+                raise Exception(f"{name}: {e}")
+            sessions, carry = pair_backfill_sessions(events, carry, stop_ts)
+            stop_ts = last_ts if last_ts is not None else stop_ts
+            with db:
+                fresh = insert_backfill_sessions(db, sessions)
+                db.execute('''
+                    INSERT INTO attendance_backfill (path, size, sessions, last_ts, carry, updated_at) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(path) DO UPDATE SET size = excluded.size, sessions = excluded.sessions,
+                        last_ts = excluded.last_ts, carry = excluded.carry, updated_at = excluded.updated_at
+                ''', (name, size, len(fresh), stop_ts, json.dumps(carry), int(time.time())))
+            os.remove(local)
+            done += 1
+            with self._lock:
+                self.state['done'] = done
+                self.state['sessions'] += len(fresh)
+                self.state['duplicates'] += len(sessions) - len(fresh)
+            progress(f"[{done}/{len(pending)}] {name}: +{len(fresh)} session"
+                     + (f" ({len(sessions) - len(fresh)} už v DB)" if len(sessions) > len(fresh) else ''))
+
+ATTENDANCE_BACKFILL = AttendanceBackfill()
+
+@app.cli.command('backfill-attendance')
+@click.option('--workers', type=int, default=BACKFILL_WORKERS, help='Počet procesů pro parsování archivů.')
+def backfill_attendance_command(workers):
+    """Doplní docházku ze starých logů serveru (logs/*.log.gz)."""
+    migrate_db(get_thread_db())
+    state = ATTENDANCE_BACKFILL.run(workers, progress=print)
+    print(f"Hotovo: {state['done']} archivů, {state['sessions']} nových session, {state['duplicates']} duplicit přeskočeno.")
+
+@app.route('/api/attendance/backfill', methods=['GET', 'POST'])
+@login_required
+def attendance_backfill():
+    """GET: průběh doplňování docházky z archivů. POST: spustí ho na pozadí."""
+    if request.method == 'POST':
+        if MOCK_MODE:
+            return jsonify({"status": "error", "message": "Backfill v mock režimu nejde (chybí SSH)"}), 400
+        if ATTENDANCE_BACKFILL.is_running():
+            return jsonify({"status": "error", "message": "Backfill už běží"}), 409
+
+        def job():
+            with app.app_context():
+                try:
+                    ATTENDANCE_BACKFILL.run(progress=lambda message: print(f"[BACKFILL] {message}"))
+                except Exception as e:
+                    print(f"[BACKFILL-ERROR] {e}")
+        threading.Thread(target=job, daemon=True).start()
+        return jsonify(dict(ATTENDANCE_BACKFILL.stats(), status="started")), 202
+    return jsonify(ATTENDANCE_BACKFILL.stats())
 
 # --- SYSTEM CONFIG API ---
 @app.route('/api/config/system', methods=['GET', 'POST'])
@@ -986,20 +3971,32 @@ def system_config_api():
                 db.execute("INSERT OR REPLACE INTO system_config (key, value) VALUES (?, ?)", (key, data[key]))
         
         db.commit()
-        db.close()
         
         # Restart connections with new config
-        global GLOBAL_RCON
-        if GLOBAL_RCON:
-            try: GLOBAL_RCON.disconnect()
-            except: pass
-            GLOBAL_RCON = None
+        RCON_POOL.reset()
+        ASYNC_RCON.reset()
+        COMMAND_CAPS.invalidate()
+        OUTPUT_FORMATS.invalidate()
             
         stop_ssh_tunnel()
+        SSH_POOL.reset()
         # Start se provede automaticky při příštím requestu nebo manuálně
         
         return jsonify({"status": "success", "message": "Nastavení systému uloženo. Připojení bude obnoveno."})
 
+@app.route('/api/rcon/pool')
+@login_required
+def rcon_pool_stats():
+    """Metriky RCON poolu (čekání na spojení, počty checkoutů) a cache dotazů."""
+    return jsonify(dict(RCON_POOL.stats(), cache=RCON_CACHE.stats(), capabilities=COMMAND_CAPS.snapshot(),
+                        formats=OUTPUT_FORMATS.snapshot()))
+
+@app.route('/api/ssh/pool')
+@login_required
+def ssh_pool_stats():
+    """Statistiky sdíleného SSH poolu (spojení, kanály, reconnecty)."""
+    return jsonify(SSH_POOL.stats())
+
 # --- SERVER PROPERTIES EDITOR ---
 
 SERVER_PROPS_HELP = {
@@ -1208,37 +4205,25 @@ def player_action():
 
     # Core actions
     elif action == 'heal':
-        r1 = get_rcon_response(f"effect give {player} minecraft:instant_health")
-        r2 = get_rcon_response(f"feed {player}")
+        feed_cmd = COMMAND_CAPS.known_command('feed', FEED_VARIANTS, player=player)
+        if feed_cmd:
+            r1, r2 = rcon_batch([f"effect give {player} minecraft:instant_health", feed_cmd])
+        else:
+            r1 = get_rcon_response(f"effect give {player} minecraft:instant_health")
+            r2, _ = COMMAND_CAPS.run('feed', FEED_VARIANTS, player=player)
         print(f"[DEBUG-ACTION] Heal results: {r1}, {r2}")
     elif action == 'feed':
-        r = get_rcon_response(f"feed {player}")
-        if "Unknown" in r or "incomplete" in r.lower():
-            # Fallback na vanilla saturation
-            r = get_rcon_response(f"effect give {player} minecraft:saturation 1 255")
+        r, _ = COMMAND_CAPS.run('feed', FEED_VARIANTS, player=player)
         print(f"[DEBUG-ACTION] Feed result: {r}")
     elif action == 'teleport_here':
         r = get_rcon_response(f"execute in minecraft:overworld run tp {player} 0 100 0") # Pull to center/spawn if @p fails
         print(f"[DEBUG-ACTION] TP result: {r}")
     elif action == 'spawn':
-        # Skusíme několik variant, protože různé verze/pluginy reagují různě
-        r = get_rcon_response(f"spawn {player}")
-        print(f"[DEBUG-ACTION] Spawn attempt 1 (direct): {r}")
-        
-        if "Unknown" in r or "incomplete" in r.lower():
-            r = get_rcon_response(f"essentials:spawn {player}")
-            print(f"[DEBUG-ACTION] Spawn attempt 2 (ns): {r}")
-            
-            if "Unknown" in r or "incomplete" in r.lower():
-                r = get_rcon_response(f"execute as {player} run spawn")
-                print(f"[DEBUG-ACTION] Spawn attempt 3 (as player): {r}")
-                
-                if "Unknown" in r or "incomplete" in r.lower():
-                    # Poslední záchrana - teleport na souřadnice 0, 100, 0 v Overworldu
-                    # Používáme execute, aby to fungovalo i z Netheru
-                    r = get_rcon_response(f"execute in minecraft:overworld run tp {player} 0 100 0")
-                    print(f"[DEBUG-ACTION] Spawn attempt 4 (tp fallback): {r}")
-                    return jsonify({"status": "success", "message": f"Příkaz /spawn neexistuje (chybí EssentialsSpawn). Hráč {player} byl teleportován na 0, 100, 0."})
+        # Různé verze/pluginy reagují různě - podporovanou variantu si pamatuje COMMAND_CAPS
+        r, variant = COMMAND_CAPS.run('spawn', SPAWN_VARIANTS, player=player)
+        print(f"[DEBUG-ACTION] Spawn result (variant {variant + 1}): {r}")
+        if variant == len(SPAWN_VARIANTS) - 1:
+            return jsonify({"status": "success", "message": f"Příkaz /spawn neexistuje (chybí EssentialsSpawn). Hráč {player} byl teleportován na 0, 100, 0."})
     elif action == 'clear_effects':
         r = get_rcon_response(f"effect clear {player}")
         print(f"[DEBUG-ACTION] Clear result: {r}")
@@ -1270,11 +4255,11 @@ def player_action():
     
     # Freeze logic
     elif action == 'freeze':
-        get_rcon_response(f"effect give {player} minecraft:slowness 10000 255")
-        get_rcon_response(f"effect give {player} minecraft:jump_boost 10000 255")
+        rcon_batch([f"effect give {player} minecraft:slowness 10000 255",
+                    f"effect give {player} minecraft:jump_boost 10000 255"])
     elif action == 'unfreeze':
-        get_rcon_response(f"effect clear {player} minecraft:slowness")
-        get_rcon_response(f"effect clear {player} minecraft:jump_boost")
+        rcon_batch([f"effect clear {player} minecraft:slowness",
+                    f"effect clear {player} minecraft:jump_boost"])
     
     # Fun & Rewards
     elif action == 'give_diamond':
@@ -1286,11 +4271,8 @@ def player_action():
             item_id = parts[0].lower().replace(" ", "_")
             count = parts[1] if len(parts) > 1 else "1"
             
-            r = get_rcon_response(f"give {player} {item_id} {count}")
-            print(f"[DEBUG-ACTION] Give Custom result 1: {r}")
-            if "Unknown" in r:
-                r = get_rcon_response(f"essentials:give {player} {item_id} {count}")
-                print(f"[DEBUG-ACTION] Give Custom result 2: {r}")
+            r, _ = COMMAND_CAPS.run('give', GIVE_VARIANTS, player=player, item=item_id, count=count)
+            print(f"[DEBUG-ACTION] Give Custom result: {r}")
             return jsonify({"status": "success", "message": f"Předmět {item_id} ({count}ks) byl předán hráči {player}."})
         else:
             return jsonify({"status": "error", "message": "Nezadali jste předmět k předání."})
@@ -1298,9 +4280,11 @@ def player_action():
         get_rcon_response(f"execute at {player} run summon lightning_bolt")
     elif action == 'get_pos':
         # Send message to admin (source), not simple tellraw to player
-        get_rcon_response(f"tellraw @a[level=4] {{\"text\":\"Pozice {player} byla zaznamenána (viz konzole).\",\"color\":\"gray\"}}")
-        # Also log to console
-        get_rcon_response(f"execute as {player} run data get entity @s Pos")
+        rcon_batch([
+            f"tellraw @a[level=4] {{\"text\":\"Pozice {player} byla zaznamenána (viz konzole).\",\"color\":\"gray\"}}",
+            # Also log to console
+            f"execute as {player} run data get entity @s Pos"
+        ])
 
     # Editable Properties (Inside Info Modal)
 
@@ -1332,20 +4316,20 @@ def player_action():
 
     # --- GLOBAL ACTIONS ---
     elif action == 'freeze_all':
-        get_rcon_response("effect give @a minecraft:slowness 10000 255")
-        get_rcon_response("effect give @a minecraft:jump_boost 10000 255")
+        rcon_batch(["effect give @a minecraft:slowness 10000 255",
+                    "effect give @a minecraft:jump_boost 10000 255"])
         return jsonify({"status": "success", "message": "Všichni hráči byli zmrazeni."})
     elif action == 'unfreeze_all':
-        get_rcon_response("effect clear @a minecraft:slowness")
-        get_rcon_response("effect clear @a minecraft:jump_boost")
+        rcon_batch(["effect clear @a minecraft:slowness",
+                    "effect clear @a minecraft:jump_boost"])
         return jsonify({"status": "success", "message": "Všichni hráči byli odmrazeni."})
     elif action == 'tp_all_here':
         # @p doesn't work well from RCON, using 0 100 0 or similar central point
         get_rcon_response("execute in minecraft:overworld run tp @a 0 100 0")
         return jsonify({"status": "success", "message": "Všichni byli teleportováni na spawn."})
     elif action == 'clear_chat_all':
-        for _ in range(20): get_rcon_response("say ")
-        get_rcon_response("say §6§lChat byl vyčištěn administrátorem.")
+        # Pipelined - server je provede ve stejném pořadí
+        rcon_batch(["say "] * 20 + ["say §6§lChat byl vyčištěn administrátorem."])
         return jsonify({"status": "success", "message": "Chat byl vyčištěn."})
         
     # Catch-all for actions that didn't return early (heal, spawn, etc.)
@@ -1356,20 +4340,21 @@ def player_action():
 @app.route('/history/table')
 @login_required
 def history_table():
-    """Vrátí HTML tabulku historie (offline i online)."""
+    """Vrátí HTML tabulku historie (offline i online) po stránkách."""
+    try:
+        params = parse_player_page_args(request.args)
+    except ValueError as e:
+        return f"Error: {e}", 400
+
     db = get_db()
-    
-    # Filtrování
-    filter_group = request.args.get('group', 'all')
-    
-    query = "SELECT * FROM players ORDER BY is_online DESC, last_seen DESC"
-    args = ()
-    
-    if filter_group != 'all':
-        query = "SELECT * FROM players WHERE group_name = ? ORDER BY is_online DESC, last_seen DESC"
-        args = (filter_group,)
-        
-    rows = db.execute(query, args).fetchall()
+    token, last_modified = content_version(db, 'players')
+    cached = not_modified(token, last_modified)
+    if cached: return cached
+
+    rows, next_cursor = fetch_player_page(db, '''
+        SELECT p.name, p.first_seen, p.first_seen_ts, p.last_seen, p.last_seen_ts, p.group_name, p.is_online
+        FROM players p
+    ''', params)
     
     players = []
     for row in rows:
@@ -1381,11 +4366,21 @@ def history_table():
             'is_online': bool(row['is_online']),
             'avatar_url': f"https://cravatar.eu/helmavatar/{row['name']}/32.png"
         })
+
+    next_url = player_page_url('history_table', params, next_cursor) if next_cursor else None
+    if params['cursor']:
+        # Další stránka: jen řádky tabulky (infinite scroll)
+        return with_validators(make_response(
+            render_template('partials/history_rows.html', players=players, next_url=next_url, more=True)),
+            token, last_modified)
         
-    # Get unique groups for filter
-    all_groups = [r['group_name'] for r in db.execute("SELECT DISTINCT group_name FROM players").fetchall()]
+    # Skupiny pro filtr (jen u první stránky; DISTINCT jde přes idx_players_group)
+    all_groups = [r['group_name'] for r in db.execute(
+        "SELECT DISTINCT group_name FROM players WHERE group_name IS NOT NULL ORDER BY group_name").fetchall()]
     
-    return render_template('partials/history_table.html', players=players, groups=all_groups, current_filter=filter_group)
+    return with_validators(make_response(render_template('partials/history_table.html', players=players, groups=all_groups,
+                           filters=params, next_url=next_url, current_filter=params['group'])),
+                           token, last_modified)
 
 @login_required
 @app.route('/api/player/group', methods=['POST'])
@@ -1396,6 +4391,7 @@ def set_group():
     if name and group:
         db = get_db()
         db.execute("UPDATE players SET group_name = ? WHERE name = ?", (group, name))
+        bump_content_version(db, 'players')
         db.commit()
     return "", 200
 
@@ -1435,24 +4431,45 @@ def whitelist_remove():
 @login_required
 @app.route('/api/logs')
 def get_logs():
+    """Konec logu jako text, nebo s ?since=<seq> jen nové řádky z LOG_BUFFER (JSON)."""
+    if request.args.get('since') is not None:
+        try:
+            since = int(request.args['since'])
+            limit = min(int(request.args.get('limit', LOG_SINCE_MAX)), LOG_SINCE_MAX)
+            if since < 0 or limit < 1: raise ValueError
+        except ValueError:
+            return jsonify({"status": "error", "message": "since a limit musí být nezáporná celá čísla"}), 400
+        if request.args.get('epoch', LOG_BUFFER.epoch) != LOG_BUFFER.epoch:
+            since = 0  # seq z dřívějšího běhu panelu - klient dostane konec bufferu
+        lines, seq, truncated = LOG_BUFFER.since(since, limit)
+        # live=False: tail neběží (bez SSH), buffer nemusí odpovídat logu
+        return jsonify({'lines': lines, 'seq': seq, 'epoch': LOG_BUFFER.epoch, 'truncated': truncated,
+                        'live': MOCK_MODE or ATTENDANCE_TRACKER.follower.running})
+
+    if MOCK_MODE or ATTENDANCE_TRACKER.follower.running:
+        token = f"log{LOG_BUFFER.epoch}.{LOG_BUFFER.seq}"
+        cached = not_modified(token)
+        if cached: return cached
+        return with_validators(jsonify('\n'.join(LOG_BUFFER.tail())), token)
+
     log_path = os.environ.get('MC_LOG_PATH', '/home/minecraft/server/logs/latest.log')
-    if MOCK_MODE:
-        return jsonify("Mock log entry 1\nMock log entry 2\n[16:30:23 INFO]: Done!")
-    
     client = get_ssh_client()
     if not client:
         return jsonify("Error: Could not connect via SSH to read logs."), 500
     
     try:
-        # Přečteme posledních 100 řádků
-        stdin, stdout, stderr = client.exec_command(f"tail -n 100 {log_path}")
-        logs_data = stdout.read().decode('utf8', errors='ignore')
-        err_data = stderr.read().decode('utf8', errors='ignore')
+        # Tail neběží: přečteme posledních 100 řádků - jen pokud se log od poslední verze klienta změnil
+        token, logs_data, err_data = read_remote_if_changed(
+            client, log_path, f"tail -n {LOG_TAIL_LINES} {shlex.quote(log_path)}", client_etag_tokens())
+        if logs_data is None:
+            return with_validators(make_response('', 304), token, remote_file_mtime(token))
         
         if err_data and not logs_data:
              return jsonify(f"CHYBA SSH: {err_data}")
         
-        return jsonify(logs_data)
+        if not token:
+            return jsonify(logs_data)
+        return with_validators(jsonify(logs_data), token, remote_file_mtime(token))
     except Exception as e:
         return jsonify(f"Exception reading logs: {e}"), 500
     finally:
@@ -1502,6 +4519,7 @@ def toggle_module():
     if m_id:
         db = get_db()
         db.execute("UPDATE modules SET enabled = ? WHERE id = ?", (1 if enabled else 0, m_id))
+        bump_content_version(db, 'modules')
         db.commit()
         return jsonify({"status": "success"})
     return jsonify({"status": "error"}), 400
@@ -1510,51 +4528,63 @@ def toggle_module():
 @app.route('/api/modules')
 def get_active_modules():
     db = get_db()
+    token, last_modified = content_version(db, 'modules')
+    cached = not_modified(token, last_modified)
+    if cached: return cached
     rows = db.execute("SELECT id, enabled FROM modules").fetchall()
-    return jsonify({row['id']: bool(row['enabled']) for row in rows})
+    return with_validators(jsonify({row['id']: bool(row['enabled']) for row in rows}), token, last_modified)
 
-@login_required
-@app.route('/api/banlist')
-def get_banlist():
-    """Načte seznam zabanovaných hráčů (SSH JSON nebo RCON fallback)."""
+def fetch_banlist(known=()):
+    """Načte seznam zabanovaných hráčů (SSH JSON nebo RCON fallback). Vrací (token, jména);
+    jména jsou None, pokud volající verzi z `known` už má."""
     # 1. Zkusíme načíst banned-players.json přes SSH (Nejpřesnější)
     if os.environ.get('SSH_HOST'):
+        ssh = get_ssh_client()
         try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            ssh.connect(
-                os.environ.get('SSH_HOST'), 
-                port=int(os.environ.get('SSH_PORT', 22)), 
-                username=os.environ.get('SSH_USER'), 
-                key_filename=os.environ.get('SSH_KEY_PATH'),
-                password=os.environ.get('SSH_PASSWORD')
-            )
+            if not ssh: raise Exception("SSH connect failed")
             
             # Cesta k JSON souboru
             server_path = os.environ.get('MC_SERVER_PATH')
             if server_path:
                 json_path = os.path.join(server_path, 'banned-players.json')
-                stdin, stdout, stderr = ssh.exec_command(f"cat {json_path}")
-                content = stdout.read().decode().strip()
+                token, content, _ = read_remote_if_changed(ssh, json_path, f"cat {shlex.quote(json_path)}", known)
+                if content is None:
+                    return token, None
+                content = content.strip()
                 
                 if content:
                     data = json.loads(content)
                     # Vrátíme pouze jména pro kompatibilitu s frontendem
                     # Seřadíme abecedně (case-insensitive)
-                    names = sorted([entry['name'] for entry in data], key=lambda x: x.lower())
-                    ssh.close()
-                    return jsonify(names)
-            ssh.close()
+                    return token, sorted([entry['name'] for entry in data], key=lambda x: x.lower())
         except Exception as e:
             print(f"SSH Banlist Error: {e}")
             # Pokračujeme na RCON fallback
+        finally:
+            if ssh: ssh.close()
             
     # 2. Fallback: RCON parsování (Méně přesné)
     response = get_rcon_response("banlist players")
-    if not response: return jsonify([])
+    if not response: return None, []
     
-    names = parse_banlist(response)
-    return jsonify(names)
+    # Odpověď je z RCON cache; verzí je otisk textu, parsování se při shodě přeskočí
+    token = 'r' + hashlib.md5(response.encode('utf8', errors='ignore')).hexdigest()[:16]
+    if token in known:
+        return token, None
+    # Známá jména oddělí jméno slepené s důvodem předchozího banu (vanilla RCON bez nových řádků)
+    known_names = {row['name'] for row in get_thread_db().execute('SELECT name FROM players')}
+    return token, parse_banlist(response, known_names)
+
+@login_required
+@app.route('/api/banlist')
+def get_banlist():
+    """Načte seznam zabanovaných hráčů (SSH JSON nebo RCON fallback)."""
+    token, names = fetch_banlist(client_etag_tokens())
+    if names is None:
+        return with_validators(make_response('', 304), token, remote_file_mtime(token))
+    if not token:
+        return jsonify(names)
+    return with_validators(jsonify(names), token, remote_file_mtime(token))
 
 
 @login_required
@@ -1564,6 +4594,7 @@ def add_to_banlist():
     reason = request.form.get('reason', 'Pravidla serveru')
     if name:
         get_rcon_response(f"ban {name} {reason}")
+        LIVE_WATCHER.poke('banlist')
         return jsonify({"status": "success"})
     return jsonify({"status": "error", "message": "No name provided"}), 400
 
@@ -1574,8 +4605,8 @@ def remove_from_banlist():
     print(f"DEBUG: Unbanning {name}")
     if name:
         # Pro jistotu zkusíme oba příkazy
-        get_rcon_response(f"pardon {name}")
-        get_rcon_response(f"unban {name}")
+        rcon_batch([f"pardon {name}", f"unban {name}"])
+        LIVE_WATCHER.poke('banlist')
         return jsonify({"status": "success"})
     return jsonify({"status": "error", "message": "No name provided"}), 400
 
@@ -1621,91 +4652,75 @@ def server_power_action(action):
     }
     
     try:
-        # Použijeme centrální konfiguraci
-        conf = get_connection_config()
-        host = conf.get('ssh_host') or os.environ.get('SSH_HOST')
-        user = conf.get('ssh_user') or os.environ.get('SSH_USER')
-        password = conf.get('ssh_password') or os.environ.get('SSH_PASSWORD')
-        port = int(conf.get('ssh_port') or os.environ.get('SSH_PORT', 22))
-
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(host, port=port, username=user, password=password)
-        
-        stdin, stdout, stderr = ssh.exec_command(cmd_map[action])
-        exit_status = stdout.channel.recv_exit_status()
-        ssh.close()
+        # Použijeme centrální SSH pool
+        ssh = get_ssh_client()
+        if not ssh: return jsonify({"status": "error", "message": "SSH connect failed"}), 500
         
-        if exit_status == 0:
-            return jsonify({"status": "success", "message": f"Server {action}ed"})
+        with ssh:
+            stdin, stdout, stderr = ssh.exec_command(cmd_map[action])
+            exit_status = stdout.channel.recv_exit_status()
+            error = stderr.read().decode() if exit_status != 0 else ''
+        LIVE_WATCHER.poke('status')
+        if exit_status != 0:
+            # Docker příkaz selhal -> server běží (nebo stojí) dál, spojení a breaker necháme být
+            return jsonify({"status": "error", "message": error}), 500
+
+        RCON_CACHE.invalidate()
+        # Stará RCON spojení jsou po restartu mrtvá; po stopu nemá smysl čekat na timeouty
+        RCON_POOL.reset()
+        ASYNC_RCON.reset()
+        COMMAND_CAPS.invalidate()
+        OUTPUT_FORMATS.invalidate()
+        if action == 'stop':
+            RCON_BREAKER.trip()
         else:
-            return jsonify({"status": "error", "message": stderr.read().decode()}), 500
+            RCON_BREAKER.reset()
+        return jsonify({"status": "success", "message": f"Server {action}ed"})
             
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+def fetch_server_status():
+    """Stav Docker kontejneru MC serveru: running / stopped."""
+    container_name = os.environ.get('MC_CONTAINER_NAME', 'informatika')
+    
+    ssh = get_ssh_client()
+    if not ssh: raise Exception("SSH connect failed")
+        
+    with ssh:
+        stdin, stdout, stderr = ssh.exec_command(f"docker inspect -f '{{{{.State.Running}}}}' {container_name}")
+        status = stdout.read().decode().strip()
+    return "running" if status == 'true' else "stopped"
+
 @login_required
 @app.route('/api/power/status')
 def server_status():
     try:
-        container_name = os.environ.get('MC_CONTAINER_NAME', 'informatika')
-        
-        conf = get_connection_config()
-        host = conf.get('ssh_host') or os.environ.get('SSH_HOST')
-        user = conf.get('ssh_user') or os.environ.get('SSH_USER')
-        password = conf.get('ssh_password') or os.environ.get('SSH_PASSWORD')
-        port = int(conf.get('ssh_port') or os.environ.get('SSH_PORT', 22))
-
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(host, port=port, username=user, password=password)
-            
-        stdin, stdout, stderr = ssh.exec_command(f"docker inspect -f '{{{{.State.Running}}}}' {container_name}")
-        status = stdout.read().decode().strip()
-        ssh.close()
-        
-        return jsonify({"status": "running" if status == 'true' else "stopped"})
+        return jsonify({"status": fetch_server_status()})
     except Exception as e:
         print(f"Status check error: {e}")
         return jsonify({"status": "error", "message": str(e)})
-        
-        if not status: status = 'unknown'
-        # Log status for debugging
-        print(f"DEBUG: Docker status: {status}")
-        return jsonify({"status": status})
-            
-    except Exception as e:
-        print(f"DEBUG: Status check error: {e}")
-        return jsonify({"status": "error", "message": str(e)}), 500
 
 @login_required
 @app.route('/api/plugins')
 def get_plugins():
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(
-            os.environ.get('SSH_HOST'), 
-            port=int(os.environ.get('SSH_PORT', 22)), 
-            username=os.environ.get('SSH_USER'), 
-            key_filename=os.environ.get('SSH_KEY_PATH'),
-            password=os.environ.get('SSH_PASSWORD')
-        )
+        ssh = get_ssh_client()
+        if not ssh: return jsonify({"status": "error", "message": "SSH connect failed"}), 500
         
         plugins_path = os.environ.get('MC_SERVER_PATH', '.') + '/plugins'
-        stdin, stdout, stderr = ssh.exec_command(f"ls -1 {plugins_path}")
-        
         files = []
+        with ssh:
+            stdin, stdout, stderr = ssh.exec_command(f"ls -1 {plugins_path}")
 
-        if stdout.channel.recv_exit_status() == 0:
-            raw_files = stdout.read().decode().splitlines()
-            for f in raw_files:
-                if f.endswith('.jar'):
-                    files.append({'name': f, 'enabled': True})
-                elif f.endswith('.jar.disabled'):
-                    files.append({'name': f.replace('.jar.disabled', '.jar'), 'enabled': False})
+            if stdout.channel.recv_exit_status() == 0:
+                raw_files = stdout.read().decode().splitlines()
+                for f in raw_files:
+                    if f.endswith('.jar'):
+                        files.append({'name': f, 'enabled': True})
+                    elif f.endswith('.jar.disabled'):
+                        files.append({'name': f.replace('.jar.disabled', '.jar'), 'enabled': False})
         
-        ssh.close()
         # Seřadit: aktivní první, pak podle abecedy
         files.sort(key=lambda x: (not x['enabled'], x['name']))
         return jsonify(files)
@@ -1722,15 +4737,8 @@ def toggle_plugin():
     if not name: return jsonify({"status": "error", "message": "No name"}), 400
     
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(
-            os.environ.get('SSH_HOST'), 
-            port=int(os.environ.get('SSH_PORT', 22)), 
-            username=os.environ.get('SSH_USER'), 
-            key_filename=os.environ.get('SSH_KEY_PATH'),
-            password=os.environ.get('SSH_PASSWORD')
-        )
+        ssh = get_ssh_client()
+        if not ssh: return jsonify({"status": "error", "message": "SSH connect failed"}), 500
 
         
         base_path = os.environ.get('MC_SERVER_PATH', '.') + '/plugins/'
@@ -1745,9 +4753,12 @@ def toggle_plugin():
             src = base_path + name
             dst = base_path + name + ".disabled"
             
-        stdin, stdout, stderr = ssh.exec_command(f"mv {src} {dst}")
-        exit_code = stdout.channel.recv_exit_status()
-        ssh.close()
+        with ssh:
+            stdin, stdout, stderr = ssh.exec_command(f"mv {src} {dst}")
+            exit_code = stdout.channel.recv_exit_status()
+        RCON_CACHE.invalidate(('pl',))
+        COMMAND_CAPS.invalidate()
+        OUTPUT_FORMATS.invalidate()
         
         if exit_code == 0:
             return jsonify({"status": "success"})
@@ -0,0 +1,81 @@
+"""
+Regresní benchmark: počet SQL dotazů na request nesmí růst s počtem hráčů.
+
+Spuštění (bez MC serveru, používá MOCK_MODE a dočasnou DB):
+    python bench_queries.py
+    python bench_queries.py 10 100 1000 5000
+"""
+import os
+import sys
+import tempfile
+import time
+
+os.environ['MOCK_MODE'] = 'True'
+import app as panel  # noqa: E402
+from flask import g  # noqa: E402
+
+SIZES = [int(a) for a in sys.argv[1:]] or [10, 100, 1000]
+ONLINE_SHARE = 0.1  # kolik hráčů je online (a má otevřenou session)
+
+_original_get_db = panel.get_db
+query_log = []
+
+def traced_get_db():
+    db = _original_get_db()
+    if not getattr(g, '_bench_traced', False):
+        db.set_trace_callback(query_log.append)
+        g._bench_traced = True
+    return db
+
+def seed(size):
+    panel.DB_PATH = tempfile.mktemp(suffix='.db')
+    panel.init_db()
+    names = [f"Player_{i:05d}" for i in range(size)]
+    online = names[:max(1, int(size * ONLINE_SHARE))]
+    now_ts = int(time.time())
+    now = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now_ts))
+    with panel.app.app_context():
+        db = _original_get_db()
+        db.executemany("INSERT INTO players (name, first_seen, first_seen_ts, last_seen, last_seen_ts, is_online) VALUES (?, ?, ?, ?, ?, ?)",
+                       [(n, now, now_ts, now, now_ts, 1 if n in online else 0) for n in names])
+        # Uzavřené session pro všechny + otevřená pro online hráče
+        db.executemany("INSERT INTO attendance (player_name, login_time, login_ts, logout_time, logout_ts, duration) VALUES (?, ?, ?, ?, ?, 60)",
+                       [(n, '2024-01-01 10:00:00', 1704099600, '2024-01-01 10:01:00', 1704099660) for n in names])
+        db.executemany("INSERT INTO attendance (player_name, login_time, login_ts) VALUES (?, ?, ?)", [(n, now, now_ts) for n in online])
+        db.commit()
+    panel.MOCK_PLAYERS = [{'name': n, 'uuid': n, 'health': 20} for n in online]
+    panel.RCON_CACHE.invalidate()
+    return names
+
+def measure(client, url):
+    query_log.clear()
+    start = time.perf_counter()
+    resp = client.get(url)
+    elapsed = (time.perf_counter() - start) * 1000
+    assert resp.status_code == 200, f"{url} -> {resp.status_code}"
+    # Dotazy na users (Flask-Login) i BEGIN/COMMIT se počítají také - jsou konstantní
+    return len(query_log), elapsed
+
+def main():
+    panel.get_db = traced_get_db
+    results = {}
+    print(f"{'players':>8} {'endpoint':<32} {'queries':>8} {'ms':>9}")
+    for size in SIZES:
+        names = seed(size)
+        client = panel.app.test_client()
+        client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        for url in ('/players/list', '/history/table', f'/api/player/detail/{names[0]}'):
+            measure(client, url)  # první volání synchronizuje DB
+            count, ms = measure(client, url)
+            key = url.split('/')[1] + '/' + url.split('/')[2]
+            results.setdefault(key, set()).add(count)
+            print(f"{size:>8} {url:<32} {count:>8} {ms:>9.1f}")
+
+    growing = [k for k, counts in results.items() if len(counts) > 1]
+    if growing:
+        print(f"FAIL: počet dotazů roste s počtem hráčů: {', '.join(growing)}")
+        sys.exit(1)
+    print("OK: počet dotazů na request je konstantní")
+
+if __name__ == '__main__':
+    main()